@@ -4,10 +4,15 @@
 """
 import asyncio
 import logging
+import time
 from datetime import datetime
 from database.connection import db
 from services.accruals import calculate_daily_accruals
+from services.balances import compact_balance_deltas
+from services.partitions import maintain_transaction_partitions
 from config.config import conf
+from monitoring.metrics import Counter, Gauge
+from monitoring.server import health, start_monitoring_server
 
 logging.basicConfig(
     level=logging.INFO,
@@ -15,27 +20,54 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+ACCRUALS_TOTAL = Counter('accruals_processed_total', 'Deposits accrued by the worker')
+ACCRUAL_RUN_DURATION = Gauge('accrual_run_duration_seconds', 'Duration of the last accrual run')
+
 
 async def run_accruals():
     """Запускает процесс начислений"""
+    monitoring = await start_monitoring_server(conf.METRICS_HOST, conf.WORKER_METRICS_PORT)
     try:
         # Подключаемся к БД
-        await db.create_pool()
+        # Пакетная обработка: ограничение времени запроса — для обработчиков бота
+        await db.create_pool(statement_timeout=0)
         logger.info("Database connection established")
+        health.ready = True
         
         # Выполняем начисления
         logger.info("Starting daily accruals calculation...")
+        started = time.perf_counter()
         result = await calculate_daily_accruals()
+        ACCRUAL_RUN_DURATION.set(time.perf_counter() - started)
+        ACCRUALS_TOTAL.inc(result['accruals_count'])
         
         logger.info(
             f"Accruals completed: {result['accruals_count']} deposits, "
             f"total amount: {result['total_accrued']} USDT"
         )
         
+        # Начисления попали в журнал — сразу сворачиваем его в балансы
+        compacted = await compact_balance_deltas(conf.BALANCE_COMPACTION_BATCH)
+        logger.info(f"Compacted {compacted} balance deltas")
+        
+        # Партиции transactions: новые месяцы вперед, старые — в архив
+        partitions = await maintain_transaction_partitions(
+            conf.TRANSACTIONS_PARTITIONS_AHEAD,
+            conf.TRANSACTIONS_RETENTION_MONTHS,
+            conf.TRANSACTIONS_ARCHIVE_DIR
+        )
+        logger.info(
+            f"Transaction partitions: created {partitions['created'] or 'none'}, "
+            f"archived {partitions['archived'] or 'none'}"
+        )
+        
     except Exception as e:
         logger.error(f"Error during accruals: {e}", exc_info=True)
     finally:
+        health.ready = False
         await db.close_pool()
+        if monitoring:
+            await monitoring.cleanup()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,112 @@
+"""
+Бенчмарк ежедневных начислений на сгенерированных данных.
+
+ВНИМАНИЕ: только для одноразовой базы (DB_* из окружения).
+
+    python -m bench.accruals --users 100000 --deposits 1000000 --truncate
+    python -m bench.accruals --no-generate --runs 3
+
+Перед каждым прогоном last_accrual_date сгенерированных депозитов сдвигается
+на вчера, поэтому прогоны повторяемы на одних и тех же данных.
+Отчет: депозитов в секунду, обращений к БД, пиковая память Python, объем WAL.
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+from typing import List, Optional
+
+from bench.datagen import generate
+from bench.seed import BENCH_USER_BASE
+from database.connection import db
+from database.migrations import migrate
+from database.testing import count_queries
+from services.accruals import calculate_daily_accruals
+
+
+async def reset_accrual_dates():
+    """Делает сгенерированные активные депозиты снова подлежащими начислению"""
+    await db.execute(
+        """UPDATE deposits SET last_accrual_date = CURRENT_DATE - 1
+           WHERE user_id > $1 AND status = 'active'""",
+        BENCH_USER_BASE
+    )
+    # После checkpoint первая запись в каждую страницу пишет ее целиком (full page image) —
+    # так объем WAL одинаков от прогона к прогону
+    await db.execute("CHECKPOINT")
+
+
+async def wal_lsn() -> str:
+    return await db.fetchval("SELECT pg_current_wal_lsn()::text")
+
+
+async def run_once(trace_memory: bool = True) -> dict:
+    """Один прогон начислений с замерами (tracemalloc заметно замедляет прогон)"""
+    wal_before = await wal_lsn()
+    peak_memory = 0
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        with count_queries() as counter:
+            result = await calculate_daily_accruals()
+        elapsed = time.perf_counter() - started
+        if trace_memory:
+            _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    wal_bytes = await db.fetchval("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), $1::text::pg_lsn)", wal_before)
+    return {
+        'accruals': result['accruals_count'],
+        'elapsed': elapsed,
+        'queries': counter.count,
+        'round_trips': counter.round_trips,
+        'db_time': counter.total_time,
+        'peak_memory': peak_memory,
+        'wal_bytes': int(wal_bytes),
+    }
+
+
+def print_run(number: int, run: dict):
+    accruals = run['accruals'] or 1
+    print(
+        f"Run {number}: {run['accruals']} deposits in {run['elapsed']:.2f}s "
+        f"({run['accruals'] / run['elapsed'] if run['elapsed'] else 0:.0f} rows/s)\n"
+        f"  round trips: {run['round_trips']} ({run['round_trips'] / accruals:.2f} per deposit), "
+        f"queries: {run['queries']}, time in queries: {run['db_time']:.2f}s\n"
+        f"  peak Python memory: {run['peak_memory'] / 2 ** 20:.1f} MiB (0 — not traced)\n"
+        f"  WAL: {run['wal_bytes'] / 2 ** 20:.1f} MiB ({run['wal_bytes'] / accruals:.0f} bytes per deposit)"
+    )
+
+
+async def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Бенчмарк ежедневных начислений")
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--deposits', type=int, default=1_000_000)
+    parser.add_argument('--history-days', type=int, default=3, help="Дней истории начислений в transactions")
+    parser.add_argument('--random-seed', type=int, default=1)
+    parser.add_argument('--truncate', action='store_true', help="Очистить все таблицы перед генерацией")
+    parser.add_argument('--no-generate', action='store_true', help="Использовать уже сгенерированные данные")
+    parser.add_argument('--runs', type=int, default=1)
+    parser.add_argument('--no-memory', action='store_true', help="Не измерять память (без накладных расходов tracemalloc)")
+    options = parser.parse_args(args)
+
+    await db.create_pool()
+    try:
+        await migrate()
+        if not options.no_generate:
+            print(f"Generating {options.users} users and {options.deposits} deposits...")
+            started = time.perf_counter()
+            await generate(options.users, options.deposits, options.history_days,
+                           options.random_seed, options.truncate)
+            print(f"Generated in {time.perf_counter() - started:.1f}s")
+        for number in range(1, options.runs + 1):
+            await reset_accrual_dates()
+            print_run(number, await run_once(not options.no_memory))
+    finally:
+        await db.close_pool()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,302 @@
+"""
+Локальная замена Telegram Bot API для нагрузочных тестов.
+
+Эмулирует методы, которые использует бот (getUpdates, sendMessage, editMessageText,
+answerCallbackQuery, sendDocument, setMyCommands, getMe, deleteWebhook, setWebhook),
+с настраиваемой задержкой и ответами 429, и сам генерирует апдейты от синтетических
+пользователей. Бот запускается без изменений, достаточно указать BOT_API_URL:
+
+    python -m bench.api_server --port 8090 --users 1000 --sessions 2000 --seed
+    BOT_API_URL=http://localhost:8090 BOT_TOKEN=123456789:BENCH python main.py
+
+Каждый пользователь проходит сценарий по шагам: следующий шаг отправляется после
+ответа бота этому пользователю и паузы --think (время «на раздумья»).
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from aiohttp import web
+
+from bench.seed import bench_users
+from bench.stats import format_latencies
+from bench.updates import ADMIN_SCENARIOS, SCENARIOS, ScenarioContext, UpdateFactory, parse_mix
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_TIMEOUT = 30
+
+
+class FakeBotApi:
+    """Состояние эмулятора: очередь апдейтов, ограничения частоты и статистика"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, flood_rate: float = 0.0,
+                 chat_limit: int = 0, global_limit: int = 0, retry_after: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.flood_rate = flood_rate
+        self.chat_limit = chat_limit
+        self.global_limit = global_limit
+        self.retry_after = retry_after
+        self.bot_id = 0
+        self.factory: Optional[UpdateFactory] = None
+
+        self._updates: Deque[dict] = deque()
+        self._updates_added = asyncio.Event()
+        self._message_ids = itertools.count(1)
+        # Время отправки исходящих сообщений: по чатам и всего (для лимитов)
+        self._chat_sends: Dict[Any, Deque[float]] = {}
+        self._global_sends: Deque[float] = deque()
+        # Пользователи, ждущие ответа бота: chat_id -> future
+        self._waiting: Dict[int, asyncio.Future] = {}
+        self._callback_users: Dict[str, int] = {}
+
+        self.calls: Dict[str, int] = {}
+        self.flood_responses = 0
+        self.response_latencies: List[float] = []
+
+    # --- Апдейты ---
+
+    def push_update(self, user_id: int, step) -> asyncio.Future:
+        """Ставит апдейт в очередь getUpdates; future завершится при ответе бота пользователю"""
+        data = self.factory.build_data(user_id, step)
+        if 'callback_query' in data:
+            self._callback_users[data['callback_query']['id']] = user_id
+        self._updates.append(data)
+        self._updates_added.set()
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[user_id] = future
+        return future
+
+    def _bot_replied(self, user_id: Optional[int]):
+        future = self._waiting.pop(user_id, None)
+        if future is not None and not future.done():
+            future.set_result(time.perf_counter())
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[dict]:
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        timeout = float(params.get('timeout') or 0)
+        while self._updates and self._updates[0]['update_id'] < offset:
+            self._updates.popleft()
+        if not self._updates and timeout:
+            self._updates_added.clear()
+            try:
+                await asyncio.wait_for(self._updates_added.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return list(itertools.islice(self._updates, limit))
+
+    # --- Лимиты ---
+
+    def _over_limit(self, sends: Deque[float], limit: int, now: float) -> bool:
+        while sends and now - sends[0] > 1.0:
+            sends.popleft()
+        return bool(limit) and len(sends) >= limit
+
+    def _flood(self, chat_id: Any) -> bool:
+        """Нужно ли ответить 429 на исходящее сообщение"""
+        if self.flood_rate and random.random() < self.flood_rate:
+            return True
+        now = time.monotonic()
+        chat_sends = self._chat_sends.setdefault(chat_id, deque())
+        if self._over_limit(chat_sends, self.chat_limit, now) or \
+                self._over_limit(self._global_sends, self.global_limit, now):
+            return True
+        chat_sends.append(now)
+        self._global_sends.append(now)
+        return False
+
+    # --- Методы Bot API ---
+
+    def _message(self, chat_id: Any, params: Dict[str, Any]) -> dict:
+        return {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': int(chat_id), 'type': 'private'},
+            'from': {'id': self.bot_id, 'is_bot': True, 'first_name': 'bench', 'username': 'bench_bot'},
+            'text': params.get('text') or params.get('caption') or '',
+        }
+
+    async def call(self, method: str, params: Dict[str, Any]) -> web.Response:
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if method == 'getUpdates':
+            return ok(await self._get_updates(params))
+
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+        if method == 'getMe':
+            return ok({'id': self.bot_id, 'is_bot': True, 'first_name': 'bench', 'username': 'bench_bot'})
+        if method in ('setMyCommands', 'deleteWebhook', 'setWebhook'):
+            return ok(True)
+        if method == 'answerCallbackQuery':
+            self._bot_replied(self._callback_users.pop(params.get('callback_query_id'), None))
+            return ok(True)
+        if method in ('sendMessage', 'editMessageText', 'sendDocument'):
+            chat_id = params.get('chat_id')
+            if chat_id is None:
+                return error(400, "Bad Request: chat_id is empty")
+            if self._flood(chat_id):
+                self.flood_responses += 1
+                return error(429, f"Too Many Requests: retry after {self.retry_after}",
+                             parameters={'retry_after': self.retry_after})
+            self._bot_replied(int(chat_id))
+            return ok(self._message(chat_id, params))
+        return error(404, "Not Found: method not found")
+
+    def report(self) -> str:
+        lines = [
+            "Bot API calls: " + ', '.join(f"{m}={n}" for m, n in sorted(self.calls.items())),
+            f"429 responses: {self.flood_responses}",
+        ]
+        if self.response_latencies:
+            lines.append(
+                f"Update -> first reply ({len(self.response_latencies)} updates), ms: "
+                f"{format_latencies(self.response_latencies)}"
+            )
+        return '\n'.join(lines)
+
+
+def ok(result: Any) -> web.Response:
+    return web.json_response({'ok': True, 'result': result})
+
+
+def error(code: int, description: str, **extra) -> web.Response:
+    return web.json_response(
+        {'ok': False, 'error_code': code, 'description': description, **extra}, status=code
+    )
+
+
+async def read_params(request: web.Request) -> Dict[str, Any]:
+    """Параметры запроса: aiogram шлет multipart/form-data, вложенные значения — JSON-строками"""
+    if request.content_type == 'application/json':
+        return await request.json()
+    params = {}
+    for key, value in (await request.post()).items():
+        params[key] = value if isinstance(value, str) else getattr(value, 'filename', '')
+    params.update(request.query)
+    return params
+
+
+def create_app(api: FakeBotApi) -> web.Application:
+    async def handle(request: web.Request) -> web.Response:
+        token = request.match_info['token']
+        api.bot_id = int(token.split(':')[0])
+        return await api.call(request.match_info['method'], await read_params(request))
+
+    app = web.Application()
+    app.router.add_route('*', '/bot{token}/{method}', handle)
+    return app
+
+
+async def simulate_users(api: FakeBotApi, ctx: ScenarioContext, mix: Dict[str, float],
+                         user_ids: List[int], admin_ids: List[int],
+                         sessions: int, concurrency: int, think: float):
+    """Прогоняет sessions сценариев, не больше concurrency пользователей одновременно"""
+    free_users: asyncio.Queue = asyncio.Queue()
+    free_admins: asyncio.Queue = asyncio.Queue()
+    for user_id in user_ids:
+        free_users.put_nowait(user_id)
+    for admin_id in admin_ids:
+        free_admins.put_nowait(admin_id)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def session(name: str):
+        pool = free_admins if name in ADMIN_SCENARIOS else free_users
+        async with semaphore:
+            user_id = await pool.get()
+            try:
+                for step in SCENARIOS[name](ctx):
+                    sent = time.perf_counter()
+                    try:
+                        replied = await asyncio.wait_for(api.push_update(user_id, step), RESPONSE_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        logger.warning("No reply to user %s for %s", user_id, step)
+                        break
+                    api.response_latencies.append(replied - sent)
+                    if think:
+                        await asyncio.sleep(random.expovariate(1 / think))
+            finally:
+                pool.put_nowait(user_id)
+
+    # Ждем, пока бот начнет опрашивать getUpdates
+    while not api.bot_id:
+        await asyncio.sleep(0.1)
+    api.factory = UpdateFactory(api.bot_id)
+    started = time.perf_counter()
+    await asyncio.gather(*(session(name) for name in random.choices(names, weights, k=sessions)))
+    elapsed = time.perf_counter() - started
+    print(f"\n{sessions} sessions, {len(api.response_latencies)} updates in {elapsed:.2f}s "
+          f"({len(api.response_latencies) / elapsed if elapsed else 0:.1f} updates/s)")
+
+
+async def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Локальная замена Telegram Bot API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency', type=float, default=0.05, help="Задержка ответа, с")
+    parser.add_argument('--jitter', type=float, default=0.02, help="Разброс задержки, с")
+    parser.add_argument('--flood-rate', type=float, default=0.0, help="Доля случайных ответов 429")
+    parser.add_argument('--chat-limit', type=int, default=0, help="Сообщений в секунду на чат (0 — без лимита)")
+    parser.add_argument('--global-limit', type=int, default=0, help="Сообщений в секунду всего (0 — без лимита)")
+    parser.add_argument('--retry-after', type=int, default=1, help="retry_after в ответах 429, с")
+    parser.add_argument('--users', type=int, default=1000, help="Синтетических пользователей")
+    parser.add_argument('--sessions', type=int, default=1000, help="Сколько сценариев выполнить")
+    parser.add_argument('--concurrency', type=int, default=50, help="Одновременно активных пользователей")
+    parser.add_argument('--think', type=float, default=0.3, help="Средняя пауза между шагами, с")
+    parser.add_argument('--mix', default='profile=4,referral=2,deposit=2,withdraw=1',
+                        help="Веса сценариев: " + ', '.join(SCENARIOS))
+    parser.add_argument('--seed', action='store_true',
+                        help="Пересоздать синтетических пользователей в БД (DB_* из окружения)")
+    parser.add_argument('--admin-password', default='', help="Пароль админки для сценария admin")
+    options = parser.parse_args(args)
+
+    ctx = ScenarioContext(admin_password=options.admin_password)
+    if options.seed:
+        from bench.seed import seed
+        from config.config import conf
+        from database import queries
+        from database.connection import db
+        from database.migrations import migrate
+        await db.create_pool()
+        try:
+            await migrate()
+            seeded = await seed(options.users, deposits_per_user=2, pending=options.sessions)
+            if not ctx.admin_password:
+                ctx.admin_password = await db.fetchval(queries.GET_SETTING, 'admin_password') or conf.ADMIN_PASSWORD
+        finally:
+            await db.close_pool()
+        ctx.pending_ids.extend(seeded.pending_ids)
+    else:
+        seeded = bench_users(options.users)
+
+    api = FakeBotApi(
+        latency=options.latency, jitter=options.jitter, flood_rate=options.flood_rate,
+        chat_limit=options.chat_limit, global_limit=options.global_limit,
+        retry_after=options.retry_after
+    )
+    runner = web.AppRunner(create_app(api), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, options.host, options.port).start()
+    print(f"Fake Bot API is listening on http://{options.host}:{options.port}")
+    try:
+        await simulate_users(
+            api, ctx, parse_mix(options.mix), seeded.user_ids, seeded.admin_ids,
+            options.sessions, options.concurrency, options.think
+        )
+    finally:
+        print(api.report())
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+"""
+Микробенчмарк денежной арифметики: прежний путь на Decimal против Money
+в целых минимальных единицах. База не нужна.
+
+    python -m bench.money --amounts 1000000
+
+Сравниваются: начисление процента с округлением до 10^-8, разбор ввода
+пользователя, форматирование суммы для сообщения и сумма. Отдельно — путь
+приложения в режиме DECIMAL (MONEY_MINOR_UNITS=0): там Money не используется,
+и строка проходит from_db -> percent -> to_db без преобразований. Полный прогон начислений
+на базе — python -m bench.accruals с MONEY_MINOR_UNITS=0 и =1.
+"""
+import argparse
+import random
+import time
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Callable, List, Optional
+
+from config.config import conf
+from money import Money, format_amount, from_db, percent, to_db
+
+_QUANT = Decimal('0.00000001')
+
+
+def decimal_percent(amount: Decimal, rate: Decimal) -> Decimal:
+    """Прежнее начисление: Decimal с округлением до точности колонки"""
+    return (amount * rate / 100).quantize(_QUANT, rounding=ROUND_HALF_UP)
+
+
+def decimal_format(balance: Decimal) -> str:
+    """Прежний utils.format_balance"""
+    if balance is None:
+        return "0 $"
+    balance_decimal = Decimal(str(balance))
+    if balance_decimal == 0:
+        return "0 $"
+    balance_str = format(balance_decimal, '.10f').rstrip('0').rstrip('.')
+    return f"{balance_str} $"
+
+
+def measure(name: str, count: int, function: Callable[[], object]) -> float:
+    started = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - started
+    print(f"  {name:<28} {elapsed:7.3f}s  {count / elapsed:12.0f} ops/s")
+    return elapsed
+
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Decimal против Money в минимальных единицах")
+    parser.add_argument('--amounts', type=int, default=1_000_000)
+    parser.add_argument('--random-seed', type=int, default=1)
+    options = parser.parse_args(args)
+
+    rnd = random.Random(options.random_seed)
+    texts = [f"{rnd.lognormvariate(4.6, 1.2):.8f}" for _ in range(options.amounts)]
+    decimals = [Decimal(text) for text in texts]
+    moneys = [Money.parse(text) for text in texts]
+    rate = Decimal('1.5')
+    count = options.amounts
+
+    # Результаты должны совпадать до единицы — иначе сравнение бессмысленно
+    mismatches = sum(
+        Money.from_decimal(decimal_percent(d, rate)) != m.percent(rate)
+        for d, m in zip(decimals, moneys)
+    )
+    print(f"{count} amounts, rate {rate}%, mismatched accruals: {mismatches}")
+
+    print("Accrual (amount * rate / 100, HALF_UP):")
+    before = measure('Decimal', count, lambda: [decimal_percent(d, rate) for d in decimals])
+    after = measure('Money', count, lambda: [m.percent(rate) for m in moneys])
+    print(f"  speedup x{before / after:.2f}")
+
+    print("Parse user input:")
+    before = measure('Decimal', count, lambda: [Decimal(t.replace(',', '.')) for t in texts])
+    after = measure('Money.parse', count, lambda: [Money.parse(t) for t in texts])
+    print(f"  speedup x{before / after:.2f}")
+
+    print("Format for message:")
+    before = measure('format_balance (Decimal)', count, lambda: [decimal_format(d) for d in decimals])
+    after = measure('Money.format', count, lambda: [m.format() for m in moneys])
+    print(f"  speedup x{before / after:.2f}")
+
+    print("Sum:")
+    before = measure('Decimal', count, lambda: sum(decimals))
+    after = measure('Money', count, lambda: sum(moneys))
+    print(f"  speedup x{before / after:.2f}")
+
+    # Путь приложения без BIGINT-колонок: должен совпадать с прежним Decimal по скорости
+    conf.MONEY_MINOR_UNITS = False
+    print("App path, DECIMAL mode (accrual row: from_db -> percent -> to_db):")
+    before = measure('Decimal', count, lambda: [decimal_percent(d, rate) for d in decimals])
+    after = measure('money helpers', count, lambda: [to_db(percent(from_db(d), rate)) for d in decimals])
+    print(f"  speedup x{before / after:.2f}")
+    print("App path, DECIMAL mode (format_balance):")
+    before = measure('format_balance (Decimal)', count, lambda: [decimal_format(d) for d in decimals])
+    after = measure('format_amount', count, lambda: [format_amount(from_db(d)) for d in decimals])
+    print(f"  speedup x{before / after:.2f}")
+
+
+if __name__ == '__main__':
+    main()
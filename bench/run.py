@@ -0,0 +1,211 @@
+"""
+Нагрузочный тест бота: настоящий Dispatcher из main.py, фейковый Bot API
+и синтетические пользователи в локальной базе.
+
+ВНИМАНИЕ: запускать только на одноразовой базе (DB_* из окружения) —
+сидирование удаляет и создает пользователей с ID > BENCH_USER_BASE.
+
+    python -m bench.run --users 2000 --sessions 1000 --concurrency 50 \
+        --mix profile=4,referral=2,deposit=2,withdraw=1,admin=1
+"""
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from bench.seed import bench_users, seed
+from bench.session import FakeSession
+from bench.stats import format_latencies, percentile
+from bench.updates import ADMIN_SCENARIOS, SCENARIOS, ScenarioContext, UpdateFactory, parse_mix
+from config.config import conf
+from database.connection import db
+from database.context import update_queries
+from database.migrations import migrate
+from handlers.admin import get_admin_password
+from main import create_bot, create_dispatcher
+from middlewares.metrics import handler_name
+
+logger = logging.getLogger(__name__)
+
+BENCH_TOKEN = '123456789:BENCHMARKBENCHMARKBENCHMARKBENCHMAR'
+
+
+@dataclass
+class UpdateSample:
+    handler: str
+    queries: int
+    db_time: float
+    latency: float = 0.0
+
+
+class SampleMiddleware(BaseMiddleware):
+    """Запоминает обработчик и число запросов к БД для каждого апдейта"""
+
+    def __init__(self):
+        self.samples: Dict[int, UpdateSample] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        try:
+            return await handler(event, data)
+        finally:
+            counter = update_queries.get()
+            self.samples[data['event_update'].update_id] = UpdateSample(
+                handler=handler_name(data),
+                queries=counter.count if counter else 0,
+                db_time=counter.total_time if counter else 0.0,
+            )
+
+
+@dataclass
+class BenchResult:
+    samples: List[UpdateSample] = field(default_factory=list)
+    errors: int = 0
+    unhandled: int = 0
+    elapsed: float = 0.0
+
+
+async def run_sessions(dp, bot, factory: UpdateFactory, ctx: ScenarioContext, mix: Dict[str, float],
+                       user_ids: List[int], admin_ids: List[int], sessions: int, concurrency: int,
+                       recorder: SampleMiddleware) -> BenchResult:
+    """
+    Выполняет sessions сценариев, не больше concurrency одновременно.
+    Шаги одного сценария идут последовательно (как у живого пользователя),
+    и один пользователь не участвует в двух сценариях сразу — иначе FSM перепутается.
+    """
+    result = BenchResult()
+    free_users: asyncio.Queue = asyncio.Queue()
+    free_admins: asyncio.Queue = asyncio.Queue()
+    for user_id in user_ids:
+        free_users.put_nowait(user_id)
+    for admin_id in admin_ids:
+        free_admins.put_nowait(admin_id)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def session(name: str):
+        pool = free_admins if name in ADMIN_SCENARIOS else free_users
+        async with semaphore:
+            user_id = await pool.get()
+            try:
+                for step in SCENARIOS[name](ctx):
+                    update = factory.build(bot, user_id, step)
+                    started = time.perf_counter()
+                    try:
+                        await dp.feed_update(bot, update)
+                    except Exception:
+                        result.errors += 1
+                        logger.exception("Update %s (%s) failed", update.update_id, step)
+                    latency = time.perf_counter() - started
+                    sample = recorder.samples.pop(update.update_id, None)
+                    if sample is None:
+                        result.unhandled += 1
+                        continue
+                    sample.latency = latency
+                    result.samples.append(sample)
+            finally:
+                pool.put_nowait(user_id)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(session(name) for name in random.choices(names, weights, k=sessions)))
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def print_report(result: BenchResult, session: FakeSession):
+    latencies = [s.latency for s in result.samples]
+    total = len(result.samples)
+    print(f"\nUpdates handled: {total} in {result.elapsed:.2f}s "
+          f"({total / result.elapsed if result.elapsed else 0:.1f} updates/s), "
+          f"errors: {result.errors}, unhandled: {result.unhandled}")
+    if not total:
+        return
+    print(f"Latency ms: {format_latencies(latencies)}")
+    print(f"Queries per update: avg={statistics.mean(s.queries for s in result.samples):.2f} "
+          f"max={max(s.queries for s in result.samples)}")
+
+    by_handler: Dict[str, List[UpdateSample]] = {}
+    for sample in result.samples:
+        by_handler.setdefault(sample.handler, []).append(sample)
+    print(f"\n{'handler':<32}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'db ms':>8}")
+    for name, samples in sorted(by_handler.items(), key=lambda item: -len(item[1])):
+        values = [s.latency for s in samples]
+        print(f"{name:<32}{len(samples):>7}"
+              f"{percentile(values, 50) * 1000:>9.1f}{percentile(values, 95) * 1000:>9.1f}"
+              f"{percentile(values, 99) * 1000:>9.1f}"
+              f"{statistics.mean(s.queries for s in samples):>9.2f}"
+              f"{statistics.mean(s.db_time for s in samples) * 1000:>8.1f}")
+
+    print("\nBot API calls: " + ', '.join(
+        f"{method}={count}" for method, count in sorted(session.calls_by_method().items())
+    ))
+
+
+async def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Нагрузочный тест обработчиков бота")
+    parser.add_argument('--users', type=int, default=1000, help="Синтетических пользователей")
+    parser.add_argument('--deposits', type=int, default=2, help="Депозитов на пользователя")
+    parser.add_argument('--pending', type=int, default=200, help="Ожидающих пополнений для одобрения")
+    parser.add_argument('--sessions', type=int, default=500, help="Сколько сценариев выполнить")
+    parser.add_argument('--concurrency', type=int, default=20, help="Одновременных сценариев")
+    parser.add_argument('--mix', default='profile=4,referral=2,deposit=2,withdraw=1,admin=1',
+                        help="Веса сценариев: " + ', '.join(SCENARIOS))
+    parser.add_argument('--api-latency', type=float, default=0.0, help="Задержка фейкового Bot API, с")
+    parser.add_argument('--no-seed', action='store_true', help="Не пересоздавать синтетические данные")
+    parser.add_argument('--throttle', action='store_true',
+                        help="Оставить ограничение частоты (THROTTLE_RATES); по умолчанию выключено")
+    options = parser.parse_args(args)
+    if options.users <= 5:
+        parser.error("--users must be greater than the number of admins (5)")
+
+    logging.getLogger('aiogram.event').setLevel(logging.WARNING)
+    mix = parse_mix(options.mix)
+
+    await db.create_pool()
+    try:
+        await migrate()
+        if options.no_seed:
+            seeded = bench_users(options.users)
+        else:
+            started = time.perf_counter()
+            seeded = await seed(options.users, options.deposits, options.pending)
+            print(f"Seeded {options.users} users in {time.perf_counter() - started:.2f}s")
+
+        session = FakeSession(latency=options.api_latency)
+        bot = create_bot(session=session, token=BENCH_TOKEN)
+        if not options.throttle:
+            # Синтетические пользователи шлют шаги сценария без пауз — лимиты исказили бы замер
+            conf.THROTTLE_RATES = ''
+        # Параллелизм задает --concurrency, а задержка меряется по feed_update —
+        # планировщик вернул бы управление до обработки. Его проверяет bench.api_server
+        conf.SCHEDULER_CONCURRENCY = 0
+        dp = create_dispatcher()
+        recorder = SampleMiddleware()
+        dp.message.middleware(recorder)
+        dp.callback_query.middleware(recorder)
+
+        ctx = ScenarioContext(admin_password=await get_admin_password())
+        ctx.pending_ids.extend(seeded.pending_ids)
+        result = await run_sessions(
+            dp, bot, UpdateFactory(bot.id), ctx, mix, seeded.user_ids, seeded.admin_ids,
+            options.sessions, options.concurrency, recorder
+        )
+        print_report(result, session)
+    finally:
+        await db.close_pool()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
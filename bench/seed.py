@@ -0,0 +1,67 @@
+"""
+Заполнение локальной (одноразовой!) базы синтетическими пользователями
+"""
+from dataclasses import dataclass
+from typing import List
+
+from config.config import conf
+from database.connection import db
+from money import SCALE
+
+# Синтетические пользователи не пересекаются с настоящими Telegram ID
+BENCH_USER_BASE = 7_000_000_000
+
+
+@dataclass
+class SeedResult:
+    admin_ids: List[int]
+    user_ids: List[int]
+    pending_ids: List[int]
+
+
+def bench_users(users: int, admins: int = 5) -> SeedResult:
+    """ID синтетических администраторов и пользователей (без сидирования)"""
+    return SeedResult(
+        admin_ids=[BENCH_USER_BASE + i for i in range(1, admins + 1)],
+        user_ids=[BENCH_USER_BASE + i for i in range(admins + 1, users + 1)],
+        pending_ids=[],
+    )
+
+
+async def seed(users: int, deposits_per_user: int, pending: int, admins: int = 5) -> SeedResult:
+    """Пересоздает синтетических пользователей, их депозиты и ожидающие пополнения"""
+    # Множитель для денежных колонок (BIGINT в минимальных единицах при MONEY_MINOR_UNITS)
+    scale = SCALE if conf.MONEY_MINOR_UNITS else 1
+    async with db.transaction('bench_seed') as tx:
+        await tx.execute("DELETE FROM users WHERE user_id > $1", BENCH_USER_BASE)
+        # Первые admins — администраторы; первые 100 — «пригласившие» для ~30% остальных
+        await tx.execute(
+            """INSERT INTO users (user_id, username, full_name, balance, referral_code, referred_by, is_admin)
+               SELECT $1::bigint + g, 'bench_' || ($1::bigint + g), 'Bench ' || g,
+                      round((100 + random() * 1000)::numeric, 2) * $4,
+                      'BENCH' || g,
+                      CASE WHEN g > 100 AND random() < 0.3
+                           THEN $1::bigint + 1 + floor(random() * 100)::bigint END,
+                      g <= $3
+               FROM generate_series(1, $2) g""",
+            BENCH_USER_BASE, users, admins, scale
+        )
+        await tx.execute(
+            """INSERT INTO deposits (user_id, amount, interest_rate, current_balance, created_at)
+               SELECT $1::bigint + g, amount, 1, amount, now() - random() * interval '90 days'
+               FROM (
+                   SELECT g, round((10 + random() * 500)::numeric, 2) * $4 AS amount
+                   FROM generate_series(1, $2) g, generate_series(1, $3) d
+               ) s""",
+            BENCH_USER_BASE, users, deposits_per_user, scale
+        )
+        pending_rows = await tx.fetch(
+            """INSERT INTO transactions (user_id, transaction_type, amount, status, description)
+               SELECT $1::bigint + $3 + 1 + (g % ($2 - $3)), 'topup', (10 + g % 90) * $5, 'pending', 'Bench topup'
+               FROM generate_series(1, $4) g
+               RETURNING transaction_id""",
+            BENCH_USER_BASE, users, admins, pending, scale
+        )
+    result = bench_users(users, admins)
+    result.pending_ids = [row['transaction_id'] for row in pending_rows]
+    return result
@@ -0,0 +1,66 @@
+"""
+Фейковая сессия Bot API: ничего не отправляет в Telegram,
+записывает вызовы и возвращает правдоподобные ответы
+"""
+import asyncio
+import itertools
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import Chat, Message, User
+
+
+@dataclass
+class RecordedCall:
+    method: str
+    chat_id: Any
+    at: float
+
+
+class FakeSession(BaseSession):
+    """Сессия, которая отвечает на запросы локально с заданной задержкой"""
+
+    def __init__(self, latency: float = 0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.calls: List[RecordedCall] = []
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        self.calls.append(RecordedCall(type(method).__name__, getattr(method, 'chat_id', None), time.perf_counter()))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._result(bot, method)
+
+    def _result(self, bot: Bot, method: TelegramMethod) -> Any:
+        returning = method.__returning__
+        if returning is Message:
+            chat_id = getattr(method, 'chat_id', None)
+            return Message(
+                message_id=next(self._message_ids),
+                date=datetime.now(),
+                chat=Chat(id=chat_id if isinstance(chat_id, int) else 0, type='private'),
+                text=getattr(method, 'text', None),
+            )
+        if returning is User:
+            return User(id=bot.id, is_bot=True, first_name='bench', username='bench_bot')
+        # bool, Union[Message, bool] (editMessageText) и т.п.
+        return True
+
+    def calls_by_method(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for call in self.calls:
+            counts[call.method] = counts.get(call.method, 0) + 1
+        return counts
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, url: str, headers: Optional[Dict[str, Any]] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        yield b''
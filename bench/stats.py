@@ -0,0 +1,18 @@
+"""Статистика для отчетов бенчмарков"""
+import math
+from typing import List
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Перцентиль p (0..100) методом ближайшего ранга"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, math.ceil(p / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def format_latencies(values: List[float]) -> str:
+    """p50/p95/p99 в миллисекундах"""
+    return (f"p50={percentile(values, 50) * 1000:.1f} "
+            f"p95={percentile(values, 95) * 1000:.1f} p99={percentile(values, 99) * 1000:.1f}")
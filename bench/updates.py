@@ -0,0 +1,131 @@
+"""
+Синтетические апдейты и сценарии пользователей для нагрузочного теста
+"""
+import itertools
+import random
+import string
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Tuple
+
+from aiogram import Bot
+from aiogram.types import Update
+
+# Шаг сценария: ('message', текст) или ('callback', callback_data)
+Step = Tuple[str, str]
+
+
+@dataclass
+class ScenarioContext:
+    """Общие данные сценариев: пароль админки и ожидающие транзакции для одобрения"""
+    admin_password: str
+    pending_ids: Deque[int] = field(default_factory=deque)
+
+
+def random_trc20_address() -> str:
+    return 'T' + ''.join(random.choices(string.ascii_letters + string.digits, k=33))
+
+
+def profile_scenario(ctx: ScenarioContext) -> List[Step]:
+    return [('message', '/profile'), ('message', '/balance'), ('callback', 'list_deposits')]
+
+
+def referral_scenario(ctx: ScenarioContext) -> List[Step]:
+    return [('message', '/referral'), ('callback', 'referrals_page_0'), ('callback', 'referral_back')]
+
+
+def deposit_scenario(ctx: ScenarioContext) -> List[Step]:
+    return [
+        ('message', '/deposits'),
+        ('callback', 'create_deposit'),
+        ('message', str(random.randint(10, 50))),
+    ]
+
+
+def withdraw_scenario(ctx: ScenarioContext) -> List[Step]:
+    return [
+        ('message', '/withdraw'),
+        ('message', str(random.randint(10, 30))),
+        ('message', random_trc20_address()),
+    ]
+
+
+def admin_scenario(ctx: ScenarioContext) -> List[Step]:
+    steps = [('message', '/admin'), ('message', ctx.admin_password), ('callback', 'admin_pending')]
+    if ctx.pending_ids:
+        steps.append(('callback', f"approve_{ctx.pending_ids.popleft()}"))
+    return steps
+
+
+SCENARIOS: Dict[str, Callable[[ScenarioContext], List[Step]]] = {
+    'profile': profile_scenario,
+    'referral': referral_scenario,
+    'deposit': deposit_scenario,
+    'withdraw': withdraw_scenario,
+    'admin': admin_scenario,
+}
+
+# Сценарии, которые выполняются от имени администратора
+ADMIN_SCENARIOS = {'admin'}
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """Разбирает смесь сценариев вида "profile=3,referral=2,deposit=1" """
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.strip().partition('=')
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario: {name!r}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class UpdateFactory:
+    """Строит апдейты от имени синтетических пользователей"""
+
+    def __init__(self, bot_id: int):
+        self.bot_id = bot_id
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    @staticmethod
+    def _user(user_id: int) -> dict:
+        return {
+            'id': user_id,
+            'is_bot': False,
+            'first_name': 'Bench',
+            'last_name': str(user_id),
+            'username': f"bench_{user_id}",
+        }
+
+    def _message(self, user_id: int, text: str, from_user: dict) -> dict:
+        return {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': from_user,
+            'text': text,
+        }
+
+    def build_data(self, user_id: int, step: Step) -> dict:
+        """Апдейт в формате JSON Bot API"""
+        kind, payload = step
+        user = self._user(user_id)
+        data = {'update_id': next(self._update_ids)}
+        if kind == 'message':
+            data['message'] = self._message(user_id, payload, user)
+        else:
+            bot_user = {'id': self.bot_id, 'is_bot': True, 'first_name': 'bench'}
+            data['callback_query'] = {
+                'id': str(data['update_id']),
+                'from': user,
+                'chat_instance': 'bench',
+                'message': self._message(user_id, 'bench', bot_user),
+                'data': payload,
+            }
+        return data
+
+    def build(self, bot: Bot, user_id: int, step: Step) -> Update:
+        """Апдейт, привязанный к боту (чтобы работали message.answer и т.п.)"""
+        return Update.model_validate(self.build_data(user_id, step), context={'bot': bot})
@@ -5,6 +5,8 @@ load_dotenv()
 
 class Config:
     BOT_TOKEN: str = os.getenv("BOT_TOKEN")
+    # Свой сервер Bot API (например, bench.api_server); пусто — api.telegram.org
+    BOT_API_URL: str = os.getenv("BOT_API_URL", "")
     DB_HOST: str = os.getenv("DB_HOST", "localhost")
     DB_PORT: str = os.getenv("DB_PORT", "5432")
     DB_NAME: str = os.getenv("DB_NAME", "investment_bot")
@@ -13,6 +15,67 @@ class Config:
     USDT_ADDRESS: str = os.getenv("USDT_ADDRESS", "")
     ADMIN_IDS: str = os.getenv("ADMIN_IDS", "")
     ADMIN_PASSWORD: str = os.getenv("ADMIN_PASSWORD", "123")
+    # Денежные колонки в BIGINT (единицы 10^-8) вместо DECIMAL(20, 8);
+    # при включении схема переводится при старте, обратного перевода нет
+    MONEY_MINOR_UNITS: bool = os.getenv("MONEY_MINOR_UNITS", "0").lower() in ("1", "true", "yes")
+    # Реплики для чтения через запятую: "host1:5432,host2:5432" (пусто — только primary)
+    DB_REPLICA_HOSTS: str = os.getenv("DB_REPLICA_HOSTS", "")
+    DB_REPLICA_MAX_LAG: float = float(os.getenv("DB_REPLICA_MAX_LAG", "5"))
+    DB_REPLICA_CHECK_INTERVAL: float = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "10"))
+    # Сколько секунд после записи пользователя его чтения идут на primary
+    DB_READ_YOUR_WRITES_WINDOW: float = float(os.getenv("DB_READ_YOUR_WRITES_WINDOW", "5"))
+    # Предупреждение, если апдейт выполнил больше запросов или повторил один запрос столько раз
+    DB_QUERY_BUDGET: int = int(os.getenv("DB_QUERY_BUDGET", "8"))
+    DB_QUERY_REPEAT_LIMIT: int = int(os.getenv("DB_QUERY_REPEAT_LIMIT", "3"))
+    # Сворачивание журнала зачислений balance_deltas в users.balance
+    BALANCE_COMPACTION_INTERVAL: float = float(os.getenv("BALANCE_COMPACTION_INTERVAL", "60"))
+    BALANCE_COMPACTION_BATCH: int = int(os.getenv("BALANCE_COMPACTION_BATCH", "5000"))
+    # HTTP-сервер мониторинга (/metrics, /healthz, /readyz); порт 0 — отключен
+    METRICS_HOST: str = os.getenv("METRICS_HOST", "0.0.0.0")
+    METRICS_PORT: int = int(os.getenv("METRICS_PORT", "8080"))
+    WORKER_METRICS_PORT: int = int(os.getenv("WORKER_METRICS_PORT", "8081"))
+    # Мониторинг event loop: период замера lag и порог предупреждения о lag, в секундах.
+    # LOOP_SLOW_CALLBACK — порог медленного синхронного колбэка (0 — отключено): включает
+    # обертку над каждым колбэком цикла, только для стандартного asyncio и для диагностики
+    LOOP_MONITOR_INTERVAL: float = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.5"))
+    LOOP_LAG_WARNING: float = float(os.getenv("LOOP_LAG_WARNING", "0.1"))
+    LOOP_SLOW_CALLBACK: float = float(os.getenv("LOOP_SLOW_CALLBACK", "0"))
+    # Профилирование по команде администратора (/profile_start)
+    PROFILER_INTERVAL: float = float(os.getenv("PROFILER_INTERVAL", "0.005"))
+    PROFILER_DEFAULT_SECONDS: float = float(os.getenv("PROFILER_DEFAULT_SECONDS", "30"))
+    PROFILER_MAX_SECONDS: float = float(os.getenv("PROFILER_MAX_SECONDS", "300"))
+    # Сколько ждать соединение из пула и сколько может выполняться запрос (0 — без ограничения)
+    DB_ACQUIRE_TIMEOUT: float = float(os.getenv("DB_ACQUIRE_TIMEOUT", "5"))
+    DB_STATEMENT_TIMEOUT: float = float(os.getenv("DB_STATEMENT_TIMEOUT", "10"))
+    # Сброс нагрузки: при перегрузке БД обработчики с флагом priority='low' отвечают «попробуйте позже».
+    # Перегрузка — среднее ожидание соединения или доля ошибок перегрузки за ~SHED_WINDOW секунд выше порога
+    SHED_WINDOW: float = float(os.getenv("SHED_WINDOW", "10"))
+    SHED_ACQUIRE_WAIT: float = float(os.getenv("SHED_ACQUIRE_WAIT", "0.5"))
+    SHED_ERROR_RATE: float = float(os.getenv("SHED_ERROR_RATE", "0.2"))
+    # Планировщик апдейтов: одновременно выполняемых обработчиков (0 — задача на каждый апдейт,
+    # без ограничения) и сколько апдейтов держать в очереди, прежде чем приостановить polling
+    SCHEDULER_CONCURRENCY: int = int(os.getenv("SCHEDULER_CONCURRENCY", "16"))
+    SCHEDULER_MAX_QUEUE: int = int(os.getenv("SCHEDULER_MAX_QUEUE", "1000"))
+    # Ограничение частоты запросов пользователя по группам обработчиков (флаг throttle):
+    # "группа=запросов/секунд,...", пустая строка отключает ограничение
+    THROTTLE_RATES: str = os.getenv("THROTTLE_RATES", "default=5/2,money=3/10,heavy=2/5,auth=3/60")
+    # "memory" — в процессе, "postgres" — общие для всех экземпляров бота
+    THROTTLE_BACKEND: str = os.getenv("THROTTLE_BACKEND", "memory")
+    THROTTLE_NOTICE_INTERVAL: float = float(os.getenv("THROTTLE_NOTICE_INTERVAL", "5"))
+    THROTTLE_SWEEP_INTERVAL: float = float(os.getenv("THROTTLE_SWEEP_INTERVAL", "60"))
+    # Сколько секунд при остановке ждать выполняющиеся апдейты и отправки
+    SHUTDOWN_TIMEOUT: float = float(os.getenv("SHUTDOWN_TIMEOUT", "8"))
+    # Помесячные партиции transactions: сколько создавать вперед и сколько месяцев
+    # хранить в базе (0 — хранить все); старые партиции архивируются в TRANSACTIONS_ARCHIVE_DIR
+    TRANSACTIONS_PARTITIONS_AHEAD: int = int(os.getenv("TRANSACTIONS_PARTITIONS_AHEAD", "3"))
+    TRANSACTIONS_RETENTION_MONTHS: int = int(os.getenv("TRANSACTIONS_RETENTION_MONTHS", "0"))
+    TRANSACTIONS_ARCHIVE_DIR: str = os.getenv("TRANSACTIONS_ARCHIVE_DIR", "archive")
+    # Трассировка апдейтов: "" (выключена), "jsonl" или "otlp"
+    TRACING_EXPORTER: str = os.getenv("TRACING_EXPORTER", "")
+    TRACING_SAMPLE_RATE: float = float(os.getenv("TRACING_SAMPLE_RATE", "0.1"))
+    TRACING_JSONL_PATH: str = os.getenv("TRACING_JSONL_PATH", "traces.jsonl")
+    TRACING_OTLP_ENDPOINT: str = os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4318")
+    TRACING_SERVICE_NAME: str = os.getenv("TRACING_SERVICE_NAME", "fn_bot")
 
 # Создаем экземпляр конфигурации
 conf = Config()
@@ -1,48 +1,542 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Iterable, List, Optional
+
 import asyncpg
 from config.config import conf
+from database.context import current_user_id, force_primary, update_queries
+from database.load import db_load
+from database.queries import Query, QUERIES, hot_queries
+from monitoring.metrics import (
+    DB_ACQUIRE_WAIT, DB_POOL_IN_USE, DB_POOL_SIZE, DB_POOL_WAITERS, DB_QUERY_DURATION, DB_QUERY_ERRORS
+)
+from monitoring.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Методы подготовленного запроса, соответствующие методам соединения
+# execute у подготовленного запроса — fetch + статус команды (см. _call_prepared)
+PREPARED_METHODS = {
+    'execute': 'fetch',
+    'executemany': 'executemany',
+    'fetch': 'fetch',
+    'fetchrow': 'fetchrow',
+    'fetchval': 'fetchval',
+}
+
+# Ошибки, после которых подготовленный запрос нужно подготовить заново
+# (например, после изменения схемы таблицы)
+STALE_STATEMENT_ERRORS = (
+    asyncpg.exceptions.InvalidCachedStatementError,
+    asyncpg.exceptions.FeatureNotSupportedError,
+    asyncpg.exceptions.InvalidSQLStatementNameError,
+)
+
+# Ошибки реплики, после которых запрос повторяется на primary
+REPLICA_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.exceptions.PostgresConnectionError,
+    asyncpg.exceptions.InterfaceError,
+    # «canceling statement due to conflict with recovery»
+    asyncpg.exceptions.SerializationError,
+)
+
+# Отставание реплики в секундах (0, если она догнала primary или это не реплика)
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+# Сколько записей о последних записях пользователей хранить до очистки
+LAST_WRITES_LIMIT = 10000
+
+
+class DatabaseBusyError(Exception):
+    """Соединение из пула не получено за DB_ACQUIRE_TIMEOUT — база перегружена"""
+
+
+class PreparedConnection(asyncpg.Connection):
+    """Соединение, хранящее подготовленные запросы из реестра"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.registry_statements = {}
+
+    async def prepare_registered(self, query: Query):
+        """Возвращает подготовленный на этом соединении запрос, готовя его при первом обращении"""
+        statement = self.registry_statements.get(query.name)
+        if statement is None:
+            statement = await self.prepare(query.sql)
+            self.registry_statements[query.name] = statement
+        return statement
+
+
+async def _call_prepared(statement, method: str, args):
+    result = await getattr(statement, PREPARED_METHODS[method])(*args)
+    if method == 'execute':
+        # Как у conn.execute: статус команды ('UPDATE 1'), а не строки
+        return statement.get_statusmsg()
+    return result
+
+
+async def _run_prepared(conn, method: str, query: Query, args):
+    statement = await conn.prepare_registered(query)
+    try:
+        return await _call_prepared(statement, method, args)
+    except STALE_STATEMENT_ERRORS:
+        conn.registry_statements.pop(query.name, None)
+        # Внутри транзакции ошибка уже прервала ее — повторять бессмысленно
+        if conn.is_in_transaction():
+            raise
+        statement = await conn.prepare_registered(query)
+        return await _call_prepared(statement, method, args)
+
+
+def query_label(query) -> str:
+    """Имя запроса из реестра или начало SQL-строки"""
+    if isinstance(query, Query):
+        return query.name
+    return ' '.join(query.split())[:80]
+
+
+def query_shape(query) -> str:
+    """Ключ для поиска повторов: имя из реестра или весь SQL (label обрезан и склеил бы разные запросы)"""
+    if isinstance(query, Query):
+        return query.name
+    return ' '.join(query.split())
+
+
+async def run_query(conn, method: str, query, args):
+    """Выполняет строку SQL или запрос из реестра на соединении conn"""
+    label = query_label(query)
+    counter = update_queries.get()
+    started = time.perf_counter()
+    error = None
+    try:
+        with tracer.span(f"db.{method}", query=label):
+            return await _run_query(conn, method, query, args)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        db_load.record_query(error)
+        if counter is not None:
+            counter.record(query_shape(query), time.perf_counter() - started)
+
+
+async def _run_query(conn, method: str, query, args):
+    if not isinstance(query, Query):
+        return await getattr(conn, method)(query, *args)
+    
+    started = time.perf_counter()
+    failed = False
+    try:
+        if query.prepare and method in PREPARED_METHODS and hasattr(conn, 'prepare_registered'):
+            return await _run_prepared(conn, method, query, args)
+        return await getattr(conn, method)(query.sql, *args)
+    except Exception:
+        failed = True
+        DB_QUERY_ERRORS.inc(query=query.name)
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        query.record(duration, failed)
+        DB_QUERY_DURATION.observe(duration, query=query.name)
+
+
+class DatabaseSession:
+    """Соединение из пула, закрепленное за блоком кода (unit of work)"""
+
+    def __init__(self, conn: asyncpg.Connection, name: str):
+        self.conn = conn
+        self.name = name
+        self.statements = 0
+        self.query_time = 0.0
+
+    async def _run(self, method: str, query, *args):
+        started = time.perf_counter()
+        try:
+            return await run_query(self.conn, method, query, args)
+        finally:
+            self.statements += 1
+            self.query_time += time.perf_counter() - started
+
+    async def execute(self, query, *args):
+        """Выполняет запрос без возврата результата"""
+        return await self._run('execute', query, *args)
+
+    async def executemany(self, query, args: Iterable):
+        """Выполняет запрос для набора аргументов одним пакетом (pipeline)"""
+        return await self._run('executemany', query, args)
+
+    async def fetch(self, query, *args):
+        """Выполняет запрос и возвращает все строки"""
+        return await self._run('fetch', query, *args)
+
+    async def fetchrow(self, query, *args):
+        """Выполняет запрос и возвращает одну строку"""
+        return await self._run('fetchrow', query, *args)
+
+    async def fetchval(self, query, *args):
+        """Выполняет запрос и возвращает одно значение"""
+        return await self._run('fetchval', query, *args)
+
+    def savepoint(self):
+        """Вложенная транзакция (SAVEPOINT): async with session.savepoint(): ..."""
+        return self.conn.transaction()
+
+
+class BlockStats:
+    """Накопленная статистика по блокам с одним именем"""
+
+    def __init__(self):
+        self.blocks = 0
+        self.statements = 0
+        self.duration = 0.0
+
+    def add(self, session: DatabaseSession, duration: float):
+        self.blocks += 1
+        self.statements += session.statements
+        self.duration += duration
+
+
+class Replica:
+    """Реплика для чтения: пул соединений и состояние"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.pool: Optional[asyncpg.Pool] = None
+        self.healthy = False
+        self.checked = False
+        self.lag: Optional[float] = None
+
+    @property
+    def name(self) -> str:
+        return f"{self.host}:{self.port}"
+
+
+def parse_replica_hosts(value: str) -> List[Replica]:
+    """Разбирает DB_REPLICA_HOSTS вида 'host1:5432,host2'"""
+    replicas = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.partition(":")
+        replicas.append(Replica(host, int(port or conf.DB_PORT)))
+    return replicas
 
 
 class Database:
     def __init__(self):
         self.pool: asyncpg.Pool = None
+        self.replicas: List[Replica] = []
+        self.block_stats: Dict[str, BlockStats] = {}
+        self._replica_index = 0
+        self._replica_monitor: Optional[asyncio.Task] = None
+        self._last_writes: Dict[int, float] = {}
+        self.statement_timeout = 0.0
 
-    async def create_pool(self):
-        """Создает пул соединений с базой данных"""
-        self.pool = await asyncpg.create_pool(
-            host=conf.DB_HOST,
-            port=int(conf.DB_PORT),
+    async def _create_pool(self, host: str, port: int, min_size: int, max_size: int,
+                           statement_timeout: float = 0) -> asyncpg.Pool:
+        return await asyncpg.create_pool(
+            host=host,
+            port=port,
             database=conf.DB_NAME,
             user=conf.DB_USER,
             password=conf.DB_PASS,
-            min_size=5,
-            max_size=20
+            min_size=min_size,
+            max_size=max_size,
+            connection_class=PreparedConnection,
+            init=self._init_connection,
+            # Зависший запрос отменяет сам Postgres и освобождает соединение (0 — без ограничения)
+            server_settings={'statement_timeout': str(int(statement_timeout * 1000))}
         )
 
-    async def close_pool(self):
-        """Закрывает пул соединений"""
-        if self.pool:
-            await self.pool.close()
+    async def create_pool(self, statement_timeout: Optional[float] = None):
+        """
+        Создает пул соединений с базой данных (primary и реплики).
+        statement_timeout по умолчанию — DB_STATEMENT_TIMEOUT
+        """
+        if statement_timeout is None:
+            statement_timeout = conf.DB_STATEMENT_TIMEOUT
+        self.statement_timeout = statement_timeout
+        self.pool = await self._create_pool(
+            conf.DB_HOST, int(conf.DB_PORT), min_size=5, max_size=20, statement_timeout=statement_timeout
+        )
+        
+        self.replicas = parse_replica_hosts(conf.DB_REPLICA_HOSTS)
+        if self.replicas:
+            await asyncio.gather(*(self._check_replica(replica) for replica in self.replicas))
+            self._replica_monitor = asyncio.create_task(self._monitor_replicas())
+
+    @staticmethod
+    async def _init_connection(conn: PreparedConnection):
+        """Подготавливает горячие запросы на новом соединении пула"""
+        for query in hot_queries():
+            try:
+                await conn.prepare_registered(query)
+            except asyncpg.PostgresError as e:
+                # Например, таблицы еще не созданы — запрос подготовится при первом вызове
+                logger.debug("Query %s is not prepared on connect: %s", query.name, e)
+                break
+
+    async def warm_up(self):
+        """
+        Занимает разом min_size соединений каждого пула и готовит на них горячие запросы,
+        чтобы первые апдейты не платили за подготовку (при создании пула таблиц
+        могло еще не быть — тогда _init_connection ничего не подготовил)
+        """
+        async def warm(pool: asyncpg.Pool, pool_name: str):
+            async with self._acquire(pool, pool_name) as conn:
+                for query in hot_queries():
+                    try:
+                        await conn.prepare_registered(query)
+                    except asyncpg.PostgresError as e:
+                        logger.warning("Query %s is not prepared on warm-up: %s", query.name, e)
+
+        pools = [(self.pool, 'primary')] + [(replica.pool, replica.name) for replica in self.replicas]
+        await asyncio.gather(*(
+            warm(pool, pool_name)
+            for pool, pool_name in pools if pool is not None
+            for _ in range(pool.get_min_size())
+        ))
+
+    def query_stats(self):
+        """Статистика вызовов запросов из реестра"""
+        return list(QUERIES.values())
+
+    async def close_pool(self, timeout: Optional[float] = None):
+        """
+        Закрывает пул соединений. Занятые соединения ждем не дольше timeout секунд,
+        после чего они закрываются принудительно
+        """
+        if self._replica_monitor:
+            self._replica_monitor.cancel()
+            self._replica_monitor = None
+        pools = [replica.pool for replica in self.replicas if replica.pool] + ([self.pool] if self.pool else [])
+        for replica in self.replicas:
+            replica.pool = None
+        self.pool = None
+        for pool in pools:
+            try:
+                await asyncio.wait_for(pool.close(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Pool connections were not released in %.0fs, terminating", timeout)
+                pool.terminate()
+
+    async def _check_replica(self, replica: Replica):
+        """Проверяет доступность и отставание реплики"""
+        try:
+            if replica.pool is None:
+                replica.pool = await self._create_pool(
+                    replica.host, replica.port, min_size=2, max_size=20, statement_timeout=self.statement_timeout
+                )
+            lag = float(await replica.pool.fetchval(REPLICA_LAG_SQL, timeout=conf.DB_REPLICA_CHECK_INTERVAL))
+        except (*REPLICA_ERRORS, asyncpg.PostgresError) as e:
+            if replica.healthy or not replica.checked:
+                logger.warning("Replica %s is unavailable: %s", replica.name, e)
+            replica.healthy = False
+            replica.checked = True
+            replica.lag = None
+            return
+        
+        healthy = lag <= conf.DB_REPLICA_MAX_LAG
+        if healthy != replica.healthy:
+            logger.info("Replica %s is %s (lag %.1f s)", replica.name, "in service" if healthy else "lagging", lag)
+        replica.healthy = healthy
+        replica.checked = True
+        replica.lag = lag
+
+    async def _monitor_replicas(self):
+        """Фоновая проверка реплик"""
+        while True:
+            await asyncio.sleep(conf.DB_REPLICA_CHECK_INTERVAL)
+            for replica in self.replicas:
+                await self._check_replica(replica)
 
-    async def execute(self, query: str, *args):
+    @asynccontextmanager
+    async def _acquire(self, pool: asyncpg.Pool, pool_name: str = 'primary'):
+        """Берет соединение из пула, учитывая время ожидания и число ожидающих"""
+        started = time.perf_counter()
+        DB_POOL_WAITERS.inc(pool=pool_name)
+        try:
+            with tracer.span('db.acquire', pool=pool_name):
+                conn = await pool.acquire(timeout=conf.DB_ACQUIRE_TIMEOUT or None)
+        except asyncio.TimeoutError:
+            db_load.record_query(asyncio.TimeoutError())
+            raise DatabaseBusyError(f"No free connection in pool {pool_name} after {conf.DB_ACQUIRE_TIMEOUT}s")
+        finally:
+            wait = time.perf_counter() - started
+            DB_POOL_WAITERS.dec(pool=pool_name)
+            DB_ACQUIRE_WAIT.observe(wait, pool=pool_name)
+            if pool is self.pool:
+                db_load.record_acquire(wait)
+        try:
+            yield conn
+        finally:
+            await pool.release(conn)
+
+    def pool_stats(self):
+        """Размер и занятость пулов: [(имя, размер, занято)]"""
+        pools = [('primary', self.pool)] + [(replica.name, replica.pool) for replica in self.replicas]
+        return [
+            (name, pool.get_size(), pool.get_size() - pool.get_idle_size())
+            for name, pool in pools if pool is not None
+        ]
+
+    @contextmanager
+    def use_primary(self):
+        """Все чтения внутри блока идут на primary: with db.use_primary(): ..."""
+        token = force_primary.set(True)
+        try:
+            yield
+        finally:
+            force_primary.reset(token)
+
+    def _record_write(self):
+        """Запоминает запись пользователя, чтобы его чтения какое-то время шли на primary"""
+        self.record_write(current_user_id.get())
+
+    def record_write(self, *user_ids: Optional[int]):
+        """
+        Чтения этих пользователей какое-то время идут на primary. Для записей,
+        затрагивающих не того, кто их сделал (админ одобрил пополнение, бонус рефереру)
+        """
+        now = time.monotonic()
+        for user_id in user_ids:
+            if user_id is None:
+                continue
+            # Порядок словаря — порядок последних записей: самые старые в начале
+            self._last_writes.pop(user_id, None)
+            self._last_writes[user_id] = now
+        window = conf.DB_READ_YOUR_WRITES_WINDOW
+        while self._last_writes:
+            user_id, last_write = next(iter(self._last_writes.items()))
+            if len(self._last_writes) <= LAST_WRITES_LIMIT and now - last_write < window:
+                break
+            del self._last_writes[user_id]
+
+    def _pick_replica(self, query) -> Optional[Replica]:
+        """Выбирает реплику для запроса или None, если читать нужно с primary"""
+        if not self.replicas or not isinstance(query, Query) or not query.readonly:
+            return None
+        if force_primary.get():
+            return None
+        user_id = current_user_id.get()
+        if user_id is not None:
+            last_write = self._last_writes.get(user_id)
+            if last_write and time.monotonic() - last_write < conf.DB_READ_YOUR_WRITES_WINDOW:
+                return None
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        self._replica_index = (self._replica_index + 1) % len(healthy)
+        return healthy[self._replica_index]
+
+    async def _run(self, method: str, query, args):
+        replica = self._pick_replica(query)
+        if replica:
+            try:
+                async with self._acquire(replica.pool, replica.name) as conn:
+                    return await run_query(conn, method, query, args)
+            except REPLICA_ERRORS as e:
+                # Реплика недоступна — выводим ее из ротации до следующей проверки
+                replica.healthy = False
+                logger.warning("Replica %s failed, falling back to primary: %s", replica.name, e)
+        elif not (isinstance(query, Query) and query.readonly):
+            self._record_write()
+        
+        async with self._acquire(self.pool) as conn:
+            return await run_query(conn, method, query, args)
+
+    async def execute(self, query, *args):
         """Выполняет запрос без возврата результата"""
-        async with self.pool.acquire() as conn:
-            await conn.execute(query, *args)
+        await self._run('execute', query, args)
+
+    async def executemany(self, query, args: Iterable):
+        """Выполняет запрос для набора аргументов одним пакетом"""
+        await self._run('executemany', query, (args,))
 
-    async def fetch(self, query: str, *args):
+    async def fetch(self, query, *args):
         """Выполняет запрос и возвращает все строки"""
-        async with self.pool.acquire() as conn:
-            return await conn.fetch(query, *args)
+        return await self._run('fetch', query, args)
 
-    async def fetchrow(self, query: str, *args):
+    async def fetchrow(self, query, *args):
         """Выполняет запрос и возвращает одну строку"""
-        async with self.pool.acquire() as conn:
-            return await conn.fetchrow(query, *args)
+        return await self._run('fetchrow', query, args)
 
-    async def fetchval(self, query: str, *args):
+    async def fetchval(self, query, *args):
         """Выполняет запрос и возвращает одно значение"""
-        async with self.pool.acquire() as conn:
-            return await conn.fetchval(query, *args)
+        return await self._run('fetchval', query, args)
+
+    @asynccontextmanager
+    async def connection(self, name: str = 'block'):
+        """
+        Закрепляет одно соединение за блоком:
+        async with db.connection('name') as conn: await conn.fetch(...)
+        """
+        started = time.perf_counter()
+        # Блоки выполняются на primary и считаются записью пользователя
+        self._record_write()
+        async with self._acquire(self.pool) as conn:
+            session = DatabaseSession(conn, name)
+            try:
+                yield session
+            finally:
+                duration = time.perf_counter() - started
+                self.block_stats.setdefault(name, BlockStats()).add(session, duration)
+                logger.debug(
+                    "DB block %s: %d statements, %.1f ms in queries, %.1f ms total",
+                    name, session.statements, session.query_time * 1000, duration * 1000
+                )
+
+    @asynccontextmanager
+    async def transaction(self, name: str = 'transaction', isolation: Optional[str] = None):
+        """
+        Выполняет блок в одной транзакции на одном соединении:
+        async with db.transaction('name') as tx: await tx.execute(...)
+        """
+        counter = update_queries.get()
+        if counter is not None:
+            counter.transactions += 1
+        async with self.connection(name) as session:
+            async with session.conn.transaction(isolation=isolation):
+                yield session
+
+    async def connect(self) -> asyncpg.Connection:
+        """Отдельное соединение с primary вне пула (например, для LISTEN)"""
+        return await asyncpg.connect(
+            host=conf.DB_HOST,
+            port=int(conf.DB_PORT),
+            database=conf.DB_NAME,
+            user=conf.DB_USER,
+            password=conf.DB_PASS
+        )
+
+    async def copy_from_query(self, query: str, *args, output, **kwargs):
+        """Выгружает результат запроса через COPY ... TO STDOUT в output"""
+        async with self._acquire(self.pool) as conn:
+            # Выгрузка может идти дольше statement_timeout; настройка сбрасывается при возврате в пул
+            await conn.execute("SET statement_timeout = 0")
+            return await conn.copy_from_query(query, *args, output=output, **kwargs)
+
+    async def copy_records_to_table(self, table: str, *, records, columns, **kwargs):
+        """Загружает записи в таблицу через COPY ... FROM STDIN"""
+        self._record_write()
+        async with self._acquire(self.pool) as conn:
+            return await conn.copy_records_to_table(table, records=records, columns=columns, **kwargs)
 
 
 # Глобальный экземпляр базы данных
 db = Database()
+
+DB_POOL_SIZE.set_function(lambda: [({'pool': name}, size) for name, size, _ in db.pool_stats()])
+DB_POOL_IN_USE.set_function(lambda: [({'pool': name}, in_use) for name, _, in_use in db.pool_stats()])
@@ -0,0 +1,43 @@
+"""Контекст текущего апдейта, доступный слою базы данных"""
+import re
+from collections import Counter
+from contextvars import ContextVar
+from typing import List, Optional
+
+# Пользователь, чей апдейт сейчас обрабатывается (устанавливает DatabaseMiddleware)
+current_user_id: ContextVar[Optional[int]] = ContextVar('current_user_id', default=None)
+
+# Принудительное чтение с primary (см. Database.use_primary)
+force_primary: ContextVar[bool] = ContextVar('force_primary', default=False)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+class QueryCounter:
+    """Запросы к БД, выполненные в рамках одного апдейта"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.transactions = 0
+        self.shapes: Counter = Counter()
+
+    def record(self, shape: str, duration: float):
+        """shape — имя запроса из реестра или полный SQL (см. connection.query_shape)"""
+        self.count += 1
+        self.total_time += duration
+        # Литералы не различаем: "WHERE id = 1" и "WHERE id = 2" — один и тот же запрос
+        self.shapes[_LITERALS.sub('?', shape)] += 1
+
+    @property
+    def round_trips(self) -> int:
+        """Запросы плюс BEGIN и COMMIT каждой транзакции"""
+        return self.count + 2 * self.transactions
+
+    def repeated(self, limit: int) -> List[str]:
+        """Запросы, повторенные limit и более раз (похоже на N+1)"""
+        return [shape for shape, calls in self.shapes.most_common() if calls >= limit]
+
+
+# Счетчик запросов текущего апдейта (устанавливает DatabaseMiddleware)
+update_queries: ContextVar[Optional[QueryCounter]] = ContextVar('update_queries', default=None)
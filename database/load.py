@@ -0,0 +1,78 @@
+"""
+Оценка нагрузки на БД для сброса нагрузки (load shedding): среднее ожидание
+соединения из пула и доля ошибок перегрузки за последние секунды.
+"""
+import asyncio
+import math
+import time
+from typing import Optional
+
+import asyncpg
+
+from config.config import conf
+from monitoring.metrics import Gauge
+
+# Ошибки, говорящие о перегрузке базы, а не о проблеме конкретного запроса
+OVERLOAD_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.exceptions.QueryCanceledError,
+    asyncpg.exceptions.TooManyConnectionsError,
+    asyncpg.exceptions.PostgresConnectionError,
+)
+
+# Меньше стольких «свежих» наблюдений — данных для вывода о перегрузке нет
+MIN_WEIGHT = 5.0
+
+
+class DecayingAverage:
+    """Среднее с экспоненциальным затуханием: вклад наблюдения уменьшается в e раз за window секунд"""
+
+    def __init__(self, window: float):
+        self.window = window
+        self.total = 0.0
+        self.weight = 0.0
+        self.updated = time.monotonic()
+
+    def _decay(self, now: float):
+        factor = math.exp(-(now - self.updated) / self.window)
+        self.total *= factor
+        self.weight *= factor
+        self.updated = now
+
+    def add(self, value: float):
+        self._decay(time.monotonic())
+        self.total += value
+        self.weight += 1
+
+    def value(self) -> Optional[float]:
+        self._decay(time.monotonic())
+        if self.weight < MIN_WEIGHT:
+            return None
+        return self.total / self.weight
+
+
+class LoadMonitor:
+    def __init__(self, window: float = 10.0):
+        self.acquire_wait = DecayingAverage(window)
+        self.error_rate = DecayingAverage(window)
+
+    def record_acquire(self, wait: float):
+        self.acquire_wait.add(wait)
+
+    def record_query(self, error: Optional[BaseException] = None):
+        self.error_rate.add(1.0 if isinstance(error, OVERLOAD_ERRORS) else 0.0)
+
+    def overloaded(self, max_acquire_wait: float, max_error_rate: float) -> bool:
+        wait = self.acquire_wait.value()
+        errors = self.error_rate.value()
+        return (wait is not None and wait > max_acquire_wait) or (errors is not None and errors > max_error_rate)
+
+
+db_load = LoadMonitor(conf.SHED_WINDOW)
+
+DB_OVERLOADED = Gauge('db_overloaded', 'Whether low-priority handlers are being shed (1) or not (0)')
+DB_ACQUIRE_WAIT_AVG = Gauge('db_acquire_wait_average_seconds', 'Decaying average of pool acquire wait')
+DB_OVERLOAD_ERROR_RATE = Gauge('db_overload_error_rate', 'Decaying share of queries failing with overload errors')
+DB_ACQUIRE_WAIT_AVG.set_function(lambda: db_load.acquire_wait.value() or 0.0)
+DB_OVERLOAD_ERROR_RATE.set_function(lambda: db_load.error_rate.value() or 0.0)
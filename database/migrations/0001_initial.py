@@ -0,0 +1,124 @@
+"""
+Исходная схема. Все операторы идемпотентны: на базе, созданной прежним
+create_tables, миграция только доводит ее до той же схемы.
+"""
+from config.config import conf
+from database.partitions import ensure_partitions, partition_transactions
+
+
+async def upgrade(conn):
+    """Таблицы и индексы в том виде, в каком их создавал create_tables"""
+    
+    # Таблица пользователей
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id BIGINT PRIMARY KEY,
+            username VARCHAR(255),
+            full_name VARCHAR(255),
+            balance DECIMAL(20, 8) DEFAULT 0,
+            reserved_balance DECIMAL(20, 8) DEFAULT 0,
+            referral_code VARCHAR(50) UNIQUE,
+            referred_by BIGINT REFERENCES users(user_id),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_admin BOOLEAN DEFAULT FALSE,
+            usdt_address VARCHAR(255)
+        )
+    """)
+    
+    # Резерв под ожидающие выводы (для таблиц, созданных до появления колонки)
+    has_reserved_balance = await conn.fetchval(
+        """SELECT EXISTS (
+               SELECT 1 FROM information_schema.columns
+               WHERE table_name = 'users' AND column_name = 'reserved_balance'
+           )"""
+    )
+    if not has_reserved_balance:
+        await conn.execute("ALTER TABLE users ADD COLUMN reserved_balance DECIMAL(20, 8) DEFAULT 0")
+    
+    # Таблица депозитов
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS deposits (
+            deposit_id SERIAL PRIMARY KEY,
+            user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
+            amount DECIMAL(20, 8) NOT NULL,
+            interest_rate DECIMAL(5, 2) NOT NULL,
+            current_balance DECIMAL(20, 8) DEFAULT 0,
+            status VARCHAR(20) DEFAULT 'active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_accrual_date DATE,
+            total_earned DECIMAL(20, 8) DEFAULT 0
+        )
+    """)
+    
+    # Таблица транзакций (помесячные партиции, см. database/partitions.py)
+    await partition_transactions(conn)
+    await ensure_partitions(conn, conf.TRANSACTIONS_PARTITIONS_AHEAD)
+    
+    # Таблица реферальных начислений
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS referral_bonuses (
+            bonus_id SERIAL PRIMARY KEY,
+            referrer_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
+            referred_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
+            amount DECIMAL(20, 8) NOT NULL,
+            transaction_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    # Журнал зачислений на баланс (сворачивается в users.balance, см. services/balances.py)
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS balance_deltas (
+            delta_id BIGSERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+            amount DECIMAL(20, 8) NOT NULL,
+            reason VARCHAR(50),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    # Таблица настроек админки
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS admin_settings (
+            setting_key VARCHAR(50) PRIMARY KEY,
+            setting_value TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    if not has_reserved_balance:
+        # Ожидающие выводы уже списаны с баланса — переносим их в резерв
+        await conn.execute(
+            """UPDATE users u
+               SET reserved_balance = p.total
+               FROM (
+                   SELECT user_id, SUM(amount) AS total
+                   FROM transactions
+                   WHERE transaction_type = 'withdraw' AND status = 'pending'
+                   GROUP BY user_id
+               ) p
+               WHERE u.user_id = p.user_id"""
+        )
+    
+    # Инициализация пароля админки, если его нет
+    existing_password = await conn.fetchval(
+        "SELECT setting_value FROM admin_settings WHERE setting_key = 'admin_password'"
+    )
+    if not existing_password:
+        await conn.execute(
+            """INSERT INTO admin_settings (setting_key, setting_value) 
+               VALUES ('admin_password', $1) 
+               ON CONFLICT (setting_key) DO NOTHING""",
+            conf.ADMIN_PASSWORD
+        )
+    
+    # Индексы для оптимизации
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_users_referral_code ON users(referral_code)")
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_deposits_user_id ON deposits(user_id)")
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_deposits_status ON deposits(status)")
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_user_created ON transactions(user_id, created_at DESC)")
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_transactions_pending ON transactions(created_at DESC) WHERE status = 'pending'"
+    )
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_referral_bonuses_referrer ON referral_bonuses(referrer_id)")
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_balance_deltas_user_id ON balance_deltas(user_id)")
@@ -0,0 +1,15 @@
+"""
+Список депозитов пользователя (USER_DEPOSITS) сортируется по created_at:
+составной индекс заменяет idx_deposits_user_id. CONCURRENTLY — без блокировки записи.
+"""
+from database.migrations import create_index_concurrently
+
+TRANSACTION = False
+
+
+async def upgrade(conn):
+    await create_index_concurrently(
+        conn, 'idx_deposits_user_created', 'deposits(user_id, created_at DESC)'
+    )
+    # Старый индекс удаляем, только когда новый построен и валиден
+    await conn.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_deposits_user_id")
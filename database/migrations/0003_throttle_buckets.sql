@@ -0,0 +1,12 @@
+-- Корзины ограничения частоты для THROTTLE_BACKEND=postgres.
+-- UNLOGGED: после сбоя сервера таблица очищается — для лимитов это допустимо,
+-- а запись не идет в WAL.
+CREATE UNLOGGED TABLE IF NOT EXISTS throttle_buckets (
+    user_id BIGINT NOT NULL,
+    bucket VARCHAR(50) NOT NULL,
+    tokens DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL,
+    full_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (user_id, bucket)
+);
+CREATE INDEX IF NOT EXISTS idx_throttle_buckets_full_at ON throttle_buckets(full_at);
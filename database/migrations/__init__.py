@@ -0,0 +1,211 @@
+"""
+Версионированные миграции схемы.
+
+Файлы в этом каталоге: NNNN_описание.sql или NNNN_описание.py (async def upgrade(conn)).
+Примененные версии и контрольные суммы файлов хранятся в schema_version;
+примененную миграцию менять нельзя — добавляйте новую.
+
+Миграция выполняется в одной транзакции вместе с записью в schema_version.
+Для CREATE INDEX CONCURRENTLY и подобного нужен режим без транзакции:
+первая строка SQL-файла "-- migrate: no-transaction" или TRANSACTION = False
+в Python-миграции. Такие миграции пишутся так, чтобы их можно было повторить
+после сбоя посередине. IF NOT EXISTS для этого недостаточно: прерванный
+CREATE INDEX CONCURRENTLY оставляет INVALID-индекс, который IF NOT EXISTS
+пропустит, — индексы строятся через create_index_concurrently().
+
+Несколько экземпляров, стартующих одновременно, выстраиваются в очередь
+на advisory lock; если схема актуальна, старт стоит одного запроса.
+"""
+import hashlib
+import importlib.util
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import asyncpg
+
+from config.config import conf
+from database.connection import db
+from database.db import ensure_money_columns
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.dirname(os.path.abspath(__file__))
+NO_TRANSACTION_MARKER = '-- migrate: no-transaction'
+# Ключ pg_advisory_lock, общий для всех экземпляров бота и воркеров
+ADVISORY_LOCK_KEY = 0x666E5F6D6967  # 'fn_mig'
+
+_FILE_NAME = re.compile(r'^(\d{4})_(\w+)\.(sql|py)$')
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    path: str
+    checksum: str
+
+    @property
+    def is_python(self) -> bool:
+        return self.path.endswith('.py')
+
+
+def discover(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    """Файлы миграций каталога в порядке версий"""
+    migrations = []
+    for file_name in sorted(os.listdir(directory)):
+        match = _FILE_NAME.match(file_name)
+        if not match:
+            continue
+        path = os.path.join(directory, file_name)
+        with open(path, 'rb') as f:
+            checksum = hashlib.sha256(f.read()).hexdigest()
+        migrations.append(Migration(int(match.group(1)), match.group(2), path, checksum))
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+async def _read_state(conn) -> Tuple[Dict[int, str], Optional[str]]:
+    """Примененные версии с контрольными суммами и тип денежных колонок — одним запросом"""
+    try:
+        rows = await conn.fetch(
+            """SELECT version, checksum,
+                      (SELECT data_type FROM information_schema.columns
+                       WHERE table_schema = current_schema()
+                         AND table_name = 'users' AND column_name = 'balance') AS money_type
+               FROM schema_version"""
+        )
+    except asyncpg.exceptions.UndefinedTableError:
+        return {}, None
+    money_type = rows[0]['money_type'] if rows else None
+    return {row['version']: row['checksum'] for row in rows}, money_type
+
+
+def _pending(migrations: List[Migration], applied: Dict[int, str]) -> List[Migration]:
+    for migration in migrations:
+        checksum = applied.get(migration.version)
+        if checksum is not None and checksum != migration.checksum:
+            raise RuntimeError(
+                f"Migration {migration.version}_{migration.name} was changed after it was applied"
+            )
+    return [m for m in migrations if m.version not in applied]
+
+
+def _money_mode_matches(money_type: Optional[str]) -> bool:
+    if money_type == 'bigint' and not conf.MONEY_MINOR_UNITS:
+        raise RuntimeError("Money columns are stored in minor units (BIGINT); set MONEY_MINOR_UNITS=1")
+    return money_type == ('bigint' if conf.MONEY_MINOR_UNITS else 'numeric')
+
+
+def _split_statements(sql: str) -> List[str]:
+    """Операторы SQL-файла (граница — ';' в конце строки); нужно для режима без транзакции"""
+    statements = re.split(r';\s*$', sql, flags=re.MULTILINE)
+    return [s.strip() for s in statements if s.strip() and not _only_comments(s)]
+
+
+def _only_comments(sql: str) -> bool:
+    return all(not line.strip() or line.strip().startswith('--') for line in sql.splitlines())
+
+
+def _load_module(migration: Migration):
+    spec = importlib.util.spec_from_file_location(f"_migration_{migration.version}", migration.path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+async def create_index_concurrently(conn, name: str, definition: str, unique: bool = False):
+    """
+    CREATE INDEX CONCURRENTLY, который можно повторить: INVALID-индекс,
+    оставшийся от прерванной попытки, удаляется и строится заново.
+    definition — 'таблица(колонки)'
+    """
+    valid = await conn.fetchval(
+        "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass($1)", name
+    )
+    if valid is False:
+        logger.warning(f"Index {name} is invalid (interrupted build), rebuilding")
+        await conn.execute(f"DROP INDEX CONCURRENTLY {name}")
+    await conn.execute(
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}"
+    )
+    valid = await conn.fetchval(
+        "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass($1)", name
+    )
+    if not valid:
+        raise RuntimeError(f"Index {name} was not built")
+
+
+async def _record(conn, migration: Migration):
+    await conn.execute(
+        "INSERT INTO schema_version (version, name, checksum) VALUES ($1, $2, $3)",
+        migration.version, migration.name, migration.checksum
+    )
+
+
+async def _apply(conn, migration: Migration):
+    if migration.is_python:
+        module = _load_module(migration)
+        run = module.upgrade
+        transactional = getattr(module, 'TRANSACTION', True)
+    else:
+        with open(migration.path, encoding='utf-8') as f:
+            sql = f.read()
+        transactional = not sql.lstrip().startswith(NO_TRANSACTION_MARKER)
+
+        async def run(conn):
+            if transactional:
+                await conn.execute(sql)
+            else:
+                for statement in _split_statements(sql):
+                    await conn.execute(statement)
+
+    if transactional:
+        async with conn.savepoint():
+            await run(conn)
+            await _record(conn, migration)
+    else:
+        await run(conn)
+        await _record(conn, migration)
+
+
+async def migrate(directory: str = MIGRATIONS_DIR) -> List[int]:
+    """Применяет недостающие миграции; возвращает примененные версии"""
+    migrations = discover(directory)
+    async with db.connection('migrate') as conn:
+        applied, money_type = await _read_state(conn)
+        if not _pending(migrations, applied) and _money_mode_matches(money_type):
+            return []
+
+        # Ожидание чужой миграции и перестроение индексов могут идти дольше DB_STATEMENT_TIMEOUT
+        await conn.execute("SET statement_timeout = 0")
+        await conn.execute("SELECT pg_advisory_lock($1)", ADVISORY_LOCK_KEY)
+        try:
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    name VARCHAR(255) NOT NULL,
+                    checksum VARCHAR(64) NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            # Пока ждали блокировку, миграции мог применить другой экземпляр
+            applied, _ = await _read_state(conn)
+            done = []
+            for migration in _pending(migrations, applied):
+                started = time.perf_counter()
+                await _apply(conn, migration)
+                logger.info(
+                    f"Applied migration {migration.version}_{migration.name} "
+                    f"in {time.perf_counter() - started:.2f}s"
+                )
+                done.append(migration.version)
+            await ensure_money_columns(conn)
+            return done
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", ADVISORY_LOCK_KEY)
@@ -3,13 +3,16 @@ from datetime import datetime, date
 from decimal import Decimal
 from typing import Optional
 
+from money import Amount, from_db
+
 
 @dataclass
 class User:
     user_id: int
     username: Optional[str]
     full_name: Optional[str]
-    balance: Decimal
+    balance: Amount
+    reserved_balance: Amount
     referral_code: str
     referred_by: Optional[int]
     created_at: datetime
@@ -22,7 +25,8 @@ class User:
             user_id=row['user_id'],
             username=row['username'],
             full_name=row['full_name'],
-            balance=row['balance'],
+            balance=from_db(row['balance']),
+            reserved_balance=from_db(row['reserved_balance']),
             referral_code=row['referral_code'],
             referred_by=row['referred_by'],
             created_at=row['created_at'],
@@ -35,26 +39,26 @@ class User:
 class Deposit:
     deposit_id: int
     user_id: int
-    amount: Decimal
+    amount: Amount
     interest_rate: Decimal
-    current_balance: Decimal
+    current_balance: Amount
     status: str
     created_at: datetime
     last_accrual_date: Optional[date]
-    total_earned: Decimal
+    total_earned: Amount
 
     @classmethod
     def from_row(cls, row):
         return cls(
             deposit_id=row['deposit_id'],
             user_id=row['user_id'],
-            amount=row['amount'],
+            amount=from_db(row['amount']),
             interest_rate=row['interest_rate'],
-            current_balance=row['current_balance'],
+            current_balance=from_db(row['current_balance']),
             status=row['status'],
             created_at=row['created_at'],
             last_accrual_date=row['last_accrual_date'],
-            total_earned=row['total_earned']
+            total_earned=from_db(row['total_earned'])
         )
 
 
@@ -63,7 +67,7 @@ class Transaction:
     transaction_id: int
     user_id: int
     transaction_type: str
-    amount: Decimal
+    amount: Amount
     status: str
     description: Optional[str]
     created_at: datetime
@@ -76,7 +80,7 @@ class Transaction:
             transaction_id=row['transaction_id'],
             user_id=row['user_id'],
             transaction_type=row['transaction_type'],
-            amount=row['amount'],
+            amount=from_db(row['amount']),
             status=row['status'],
             description=row['description'],
             created_at=row['created_at'],
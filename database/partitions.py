@@ -0,0 +1,169 @@
+"""
+Помесячные партиции таблицы transactions (PARTITION BY RANGE (created_at)).
+
+Партиции называются transactions_pГГГГ_ММ и создаются заранее на несколько
+месяцев вперед. transactions_default ловит строки вне созданных диапазонов
+и в норме пуста. Таблица, созданная до партиционирования, подключается
+целиком как партиция transactions_legacy — без копирования строк.
+"""
+import logging
+import re
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import List, Optional
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+PARENT = 'transactions'
+DEFAULT_PARTITION = 'transactions_default'
+LEGACY_PARTITION = 'transactions_legacy'
+
+_BOUND = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+
+@dataclass
+class Partition:
+    name: str
+    # None — MINVALUE/MAXVALUE или партиция по умолчанию
+    start: Optional[datetime]
+    end: Optional[datetime]
+    is_default: bool = False
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT}_p{month.year:04d}_{month.month:02d}"
+
+
+def _parse_bound(value: str) -> Optional[datetime]:
+    if value in ('MINVALUE', 'MAXVALUE'):
+        return None
+    return datetime.fromisoformat(value.strip("'"))
+
+
+async def list_partitions(conn) -> List[Partition]:
+    """Партиции transactions в порядке диапазонов"""
+    rows = await conn.fetch(
+        """SELECT c.relname AS name, pg_get_expr(c.relpartbound, c.oid) AS bound
+           FROM pg_inherits i
+           JOIN pg_class c ON c.oid = i.inhrelid
+           WHERE i.inhparent = $1::text::regclass""",
+        PARENT
+    )
+    partitions = []
+    for row in rows:
+        if row['bound'] == 'DEFAULT':
+            partitions.append(Partition(row['name'], None, None, is_default=True))
+            continue
+        start, end = _BOUND.search(row['bound']).groups()
+        partitions.append(Partition(row['name'], _parse_bound(start), _parse_bound(end)))
+    return sorted(partitions, key=lambda p: (p.is_default, p.end or datetime.max))
+
+
+def _overlaps(partition: Partition, start: datetime, end: datetime) -> bool:
+    if partition.is_default:
+        return False
+    return (partition.start is None or partition.start < end) and (partition.end is None or partition.end > start)
+
+
+async def ensure_partitions(conn, months_ahead: int, since: Optional[date] = None) -> List[str]:
+    """
+    Создает недостающие помесячные партиции от since (по умолчанию — текущий месяц)
+    до months_ahead месяцев вперед. Месяцы, уже покрытые партицией, пропускаются.
+    Возвращает имена созданных партиций.
+    """
+    existing = await list_partitions(conn)
+    month = month_start(since or date.today())
+    last = add_months(month_start(date.today()), months_ahead)
+    created = []
+    while month <= last:
+        start = datetime.combine(month, datetime.min.time())
+        end = datetime.combine(add_months(month, 1), datetime.min.time())
+        if not any(_overlaps(p, start, end) for p in existing):
+            name = partition_name(month)
+            try:
+                async with conn.savepoint():
+                    await conn.execute(
+                        f"CREATE TABLE {name} PARTITION OF {PARENT} "
+                        f"FOR VALUES FROM ('{start.isoformat(' ')}') TO ('{end.isoformat(' ')}')"
+                    )
+                created.append(name)
+            except asyncpg.exceptions.CheckViolationError:
+                # В партиции по умолчанию уже есть строки этого месяца — их нужно
+                # перенести вручную, иначе партиция не создастся
+                logger.error(f"Cannot create partition {name}: {DEFAULT_PARTITION} has rows for this month")
+        month = add_months(month, 1)
+    return created
+
+
+async def partition_transactions(conn):
+    """
+    Создает партиционированную transactions или переводит на партиции
+    обычную таблицу из прежних версий (одна транзакция, строки не копируются)
+    """
+    relkind = await conn.fetchval("SELECT relkind FROM pg_class WHERE oid = to_regclass($1)", PARENT)
+    if relkind == 'p':
+        return
+
+    async with conn.savepoint():
+        await conn.execute(f"CREATE SEQUENCE IF NOT EXISTS {PARENT}_transaction_id_seq AS INTEGER")
+        if relkind is None:
+            await conn.execute(f"""
+                CREATE TABLE {PARENT} (
+                    transaction_id INTEGER NOT NULL DEFAULT nextval('{PARENT}_transaction_id_seq'),
+                    user_id BIGINT,
+                    transaction_type VARCHAR(50) NOT NULL,
+                    amount DECIMAL(20, 8) NOT NULL,
+                    status VARCHAR(20) DEFAULT 'pending',
+                    description TEXT,
+                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    deposit_id INTEGER,
+                    admin_id BIGINT
+                ) PARTITION BY RANGE (created_at)
+            """)
+        else:
+            logger.info(f"Converting {PARENT} to a partitioned table")
+            # Уникальность transaction_id без created_at на партициях не обеспечить —
+            # внешний ключ referral_bonuses.transaction_id снимается
+            await conn.execute(
+                "ALTER TABLE IF EXISTS referral_bonuses DROP CONSTRAINT IF EXISTS referral_bonuses_transaction_id_fkey"
+            )
+            await conn.execute(f"ALTER TABLE {PARENT} RENAME TO {LEGACY_PARTITION}")
+            await conn.execute("DROP INDEX IF EXISTS idx_transactions_user_id, idx_transactions_status")
+            await conn.execute(f"UPDATE {LEGACY_PARTITION} SET created_at = 'epoch' WHERE created_at IS NULL")
+            await conn.execute(f"""
+                ALTER TABLE {LEGACY_PARTITION}
+                    ALTER COLUMN created_at SET NOT NULL,
+                    DROP CONSTRAINT transactions_pkey,
+                    ADD PRIMARY KEY (transaction_id, created_at)
+            """)
+            # Те же колонки, типы и значения по умолчанию (в т.ч. nextval той же последовательности)
+            await conn.execute(
+                f"CREATE TABLE {PARENT} (LIKE {LEGACY_PARTITION} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)"
+            )
+
+        await conn.execute(f"ALTER SEQUENCE {PARENT}_transaction_id_seq OWNED BY {PARENT}.transaction_id")
+        await conn.execute(f"""
+            ALTER TABLE {PARENT}
+                ADD PRIMARY KEY (transaction_id, created_at),
+                ADD FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
+                ADD FOREIGN KEY (deposit_id) REFERENCES deposits(deposit_id)
+        """)
+        if relkind is not None:
+            # Старые строки (включая текущий месяц) остаются в одной партиции
+            boundary = add_months(month_start(date.today()), 1)
+            await conn.execute(
+                f"ALTER TABLE {PARENT} ATTACH PARTITION {LEGACY_PARTITION} "
+                f"FOR VALUES FROM (MINVALUE) TO ('{boundary.isoformat()}')"
+            )
+        await conn.execute(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT} DEFAULT")
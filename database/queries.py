@@ -0,0 +1,349 @@
+"""
+Реестр именованных SQL-запросов.
+Горячие запросы (prepare=True) подготавливаются на каждом соединении пула
+при его создании; по каждому запросу собирается число вызовов и время.
+Запросы только на чтение (readonly=True) могут выполняться на репликах.
+Использование: await db.fetchrow(queries.USER_BY_ID, user_id)
+"""
+from dataclasses import dataclass
+from typing import Dict, List
+
+
+@dataclass(eq=False)
+class Query:
+    name: str
+    sql: str
+    prepare: bool = True
+    readonly: bool = False
+    calls: int = 0
+    errors: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+
+    def record(self, duration: float, failed: bool = False):
+        """Учитывает один вызов запроса"""
+        self.calls += 1
+        self.total_time += duration
+        if duration > self.max_time:
+            self.max_time = duration
+        if failed:
+            self.errors += 1
+
+    @property
+    def avg_time(self) -> float:
+        return self.total_time / self.calls if self.calls else 0.0
+
+
+QUERIES: Dict[str, Query] = {}
+
+
+def register(name: str, sql: str, prepare: bool = True, readonly: bool = False) -> Query:
+    """Регистрирует именованный запрос"""
+    if name in QUERIES:
+        raise ValueError(f"Query {name!r} is already registered")
+    query = Query(name=name, sql=sql, prepare=prepare, readonly=readonly)
+    QUERIES[name] = query
+    return query
+
+
+def get(name: str) -> Query:
+    """Возвращает запрос по имени"""
+    return QUERIES[name]
+
+
+def hot_queries() -> List[Query]:
+    """Запросы, подготавливаемые при создании соединения"""
+    return [query for query in QUERIES.values() if query.prepare]
+
+
+# Текущий баланс — контрольная точка users.balance плюс еще не свернутые
+# записи журнала balance_deltas (см. CREDIT_BALANCE и COMPACT_BALANCE_DELTAS)
+CURRENT_BALANCE = (
+    "users.balance + COALESCE("
+    "(SELECT SUM(d.amount) FROM balance_deltas d WHERE d.user_id = users.user_id), 0)"
+)
+
+USER_COLUMNS = (
+    f"user_id, username, full_name, {CURRENT_BALANCE} AS balance, reserved_balance, referral_code, "
+    "referred_by, created_at, is_admin, usdt_address"
+)
+
+
+# --- Пользователи ---
+
+USER_BY_ID = register('user_by_id', f"""
+    SELECT {USER_COLUMNS} FROM users WHERE user_id = $1
+""", readonly=True)
+
+USER_BY_USERNAME = register('user_by_username', f"""
+    SELECT {USER_COLUMNS} FROM users WHERE username = $1
+""", prepare=False, readonly=True)
+
+USER_ID_BY_REFERRAL_CODE = register('user_id_by_referral_code', """
+    SELECT user_id FROM users WHERE referral_code = $1
+""", readonly=True)
+
+CREATE_USER = register('create_user', """
+    INSERT INTO users (user_id, username, full_name, referral_code, referred_by)
+    VALUES ($1, $2, $3, $4, $5)
+""")
+
+USER_IS_ADMIN = register('user_is_admin', """
+    SELECT is_admin FROM users WHERE user_id = $1
+""", readonly=True)
+
+COUNT_REFERRALS = register('count_referrals', """
+    SELECT COUNT(*) FROM users WHERE referred_by = $1
+""", readonly=True)
+
+REFERRALS_PAGE = register('referrals_page', """
+    SELECT user_id, username, full_name, created_at
+    FROM users
+    WHERE referred_by = $1
+    ORDER BY created_at DESC
+    LIMIT $2 OFFSET $3
+""", readonly=True)
+
+SUM_REFERRAL_BONUSES = register('sum_referral_bonuses', """
+    SELECT COALESCE(SUM(amount), 0) FROM referral_bonuses WHERE referrer_id = $1
+""", readonly=True)
+
+# Зачисления не трогают строку пользователя: запись добавляется в журнал,
+# поэтому одновременные зачисления одному пользователю не ждут блокировку строки
+CREDIT_BALANCE = register('credit_balance', """
+    INSERT INTO balance_deltas (user_id, amount, reason) VALUES ($2, $1, $3)
+""")
+
+# Перед списанием журнал пользователя сворачивается в users.balance,
+# чтобы проверка balance >= сумма видела все зачисления
+FOLD_BALANCE_DELTAS = register('fold_balance_deltas', """
+    WITH folded AS (
+        DELETE FROM balance_deltas WHERE user_id = $1 RETURNING amount
+    )
+    UPDATE users
+    SET balance = balance + (SELECT SUM(amount) FROM folded)
+    WHERE user_id = $1 AND EXISTS (SELECT 1 FROM folded)
+""")
+
+# Периодическое сворачивание журнала: пачка записей переносится в users.balance,
+# записи, заблокированные параллельным списанием, пропускаются
+COMPACT_BALANCE_DELTAS = register('compact_balance_deltas', """
+    WITH batch AS (
+        DELETE FROM balance_deltas
+        WHERE delta_id IN (
+            SELECT delta_id FROM balance_deltas
+            ORDER BY delta_id
+            LIMIT $1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING user_id, amount
+    ), applied AS (
+        UPDATE users u
+        SET balance = u.balance + b.total
+        FROM (SELECT user_id, SUM(amount) AS total FROM batch GROUP BY user_id) b
+        WHERE u.user_id = b.user_id
+        RETURNING u.user_id
+    )
+    SELECT (SELECT COUNT(*) FROM batch) AS deltas, (SELECT COUNT(*) FROM applied) AS users
+""", prepare=False)
+
+
+# --- Депозиты ---
+
+COUNT_ACTIVE_DEPOSITS = register('count_active_deposits', """
+    SELECT COUNT(*) FROM deposits WHERE user_id = $1 AND status = 'active'
+""", readonly=True)
+
+USER_DEPOSITS = register('user_deposits', """
+    SELECT * FROM deposits WHERE user_id = $1 ORDER BY created_at DESC
+""", readonly=True)
+
+ACTIVE_DEPOSITS = register('active_deposits', """
+    SELECT * FROM deposits WHERE status = 'active'
+""", prepare=False)
+
+ACCRUE_DEPOSIT = register('accrue_deposit', """
+    UPDATE deposits
+    SET current_balance = $1,
+        last_accrual_date = $2,
+        total_earned = total_earned + $3
+    WHERE deposit_id = $4
+""", prepare=False)
+
+INSERT_ACCRUAL_TRANSACTION = register('insert_accrual_transaction', """
+    INSERT INTO transactions (user_id, transaction_type, amount, status, description, deposit_id)
+    VALUES ($1, 'daily_accrual', $2, 'completed', 'Ежедневное начисление по депозиту', $3)
+""", prepare=False)
+
+# Списание, депозит, транзакция и реферальный бонус одним запросом.
+# Проверка баланса выполняется в самом UPDATE, поэтому два одновременных
+# запроса не могут списать больше, чем есть на балансе.
+CREATE_DEPOSIT = register('create_deposit', """
+    WITH debited AS (
+        UPDATE users
+        SET balance = balance - $2
+        WHERE user_id = $1 AND balance >= $2
+        RETURNING user_id, referred_by
+    ), new_deposit AS (
+        INSERT INTO deposits (user_id, amount, interest_rate, current_balance, status)
+        SELECT user_id, $2, $3, $2, 'active' FROM debited
+        RETURNING deposit_id, user_id
+    ), deposit_transaction AS (
+        INSERT INTO transactions (user_id, transaction_type, amount, status, description, deposit_id)
+        SELECT user_id, 'deposit_created', $2, 'completed', 'Создание депозита', deposit_id
+        FROM new_deposit
+    ), referrer AS (
+        INSERT INTO balance_deltas (user_id, amount, reason)
+        SELECT referred_by, $4, 'referral_bonus' FROM debited WHERE referred_by IS NOT NULL
+        RETURNING user_id
+    ), referral_bonus AS (
+        INSERT INTO referral_bonuses (referrer_id, referred_id, amount)
+        SELECT user_id, $1, $4 FROM referrer
+    )
+    SELECT deposit_id, (SELECT user_id FROM referrer) AS referrer_id FROM new_deposit
+""")
+
+
+# --- Транзакции ---
+
+CREATE_TOPUP = register('create_topup', """
+    INSERT INTO transactions (user_id, transaction_type, amount, status, description)
+    VALUES ($1, 'topup', $2, 'pending', $3)
+    RETURNING transaction_id
+""")
+
+# Резервирование средств и заявка на вывод одним запросом: сумма переносится
+# из balance в reserved_balance только если баланса хватает.
+RESERVE_WITHDRAWAL = register('reserve_withdrawal', """
+    WITH reserved AS (
+        UPDATE users
+        SET balance = balance - $2,
+            reserved_balance = reserved_balance + $2
+        WHERE user_id = $1 AND balance >= $2
+        RETURNING user_id
+    )
+    INSERT INTO transactions (user_id, transaction_type, amount, status, description)
+    SELECT user_id, 'withdraw', $2, 'pending', $3 FROM reserved
+    RETURNING transaction_id
+""")
+
+TRANSACTION_BY_ID = register('transaction_by_id', """
+    SELECT * FROM transactions WHERE transaction_id = $1
+""", prepare=False, readonly=True)
+
+TRANSACTION_EXISTS = register('transaction_exists', """
+    SELECT 1 FROM transactions WHERE transaction_id = $1
+""", prepare=False, readonly=True)
+
+PENDING_TRANSACTIONS = register('pending_transactions', """
+    SELECT t.*, u.username, u.full_name
+    FROM transactions t
+    JOIN users u ON t.user_id = u.user_id
+    WHERE t.status = 'pending'
+    ORDER BY t.created_at DESC
+    LIMIT 20
+""", prepare=False, readonly=True)
+
+INSERT_ADMIN_TOPUP = register('insert_admin_topup', """
+    INSERT INTO transactions (user_id, transaction_type, amount, status, description, admin_id)
+    VALUES ($1, 'admin_topup', $2, 'completed', 'Пополнение администратором', $3)
+""", prepare=False)
+
+# Решение по заявке — compare-and-set по status = 'pending' вместе с изменением
+# баланса в одном запросе: повторное нажатие или второй администратор
+# получают пустой результат и ничего не меняют.
+APPROVE_TRANSACTION = register('approve_transaction', """
+    WITH decided AS (
+        UPDATE transactions
+        SET status = 'completed', admin_id = $2
+        WHERE transaction_id = $1 AND status = 'pending'
+        RETURNING transaction_id, user_id, transaction_type, amount, description
+    ), topup_credit AS (
+        INSERT INTO balance_deltas (user_id, amount, reason)
+        SELECT user_id, amount, 'topup' FROM decided WHERE transaction_type = 'topup'
+    ), withdraw_release AS (
+        UPDATE users u
+        SET reserved_balance = u.reserved_balance - d.amount
+        FROM decided d
+        WHERE u.user_id = d.user_id
+          AND d.transaction_type = 'withdraw'
+    )
+    SELECT * FROM decided
+""", prepare=False)
+
+REJECT_TRANSACTION = register('reject_transaction', """
+    WITH decided AS (
+        UPDATE transactions
+        SET status = 'rejected', admin_id = $2,
+            description = COALESCE(description, '') || $3
+        WHERE transaction_id = $1 AND status = 'pending'
+        RETURNING transaction_id, user_id, transaction_type, amount, description
+    ), balance_effect AS (
+        UPDATE users u
+        SET balance = u.balance + d.amount,
+            reserved_balance = u.reserved_balance - d.amount
+        FROM decided d
+        WHERE u.user_id = d.user_id
+          AND d.transaction_type = 'withdraw'
+    )
+    SELECT * FROM decided
+""", prepare=False)
+
+
+# --- Настройки ---
+
+GET_SETTING = register('get_setting', """
+    SELECT setting_value FROM admin_settings WHERE setting_key = $1
+""", readonly=True)
+
+SET_SETTING = register('set_setting', """
+    INSERT INTO admin_settings (setting_key, setting_value)
+    VALUES ($1, $2)
+    ON CONFLICT (setting_key)
+    DO UPDATE SET setting_value = $2, updated_at = CURRENT_TIMESTAMP
+""", prepare=False)
+
+ALL_SETTINGS = register('all_settings', """
+    SELECT setting_key, setting_value FROM admin_settings
+""", readonly=True)
+
+# Доставляется слушателям после COMMIT транзакции; payload — ключ настройки
+NOTIFY_SETTING = register('notify_setting', """
+    SELECT pg_notify('admin_settings', $1)
+""", prepare=False)
+
+
+# --- Статистика ---
+
+ADMIN_STATS = register('admin_stats', """
+    SELECT
+        (SELECT COUNT(*) FROM users) AS total_users,
+        (SELECT COALESCE(SUM(balance), 0) FROM users)
+            + (SELECT COALESCE(SUM(amount), 0) FROM balance_deltas) AS total_balance,
+        (SELECT COUNT(*) FROM deposits WHERE status = 'active') AS total_deposits,
+        (SELECT COALESCE(SUM(current_balance), 0) FROM deposits WHERE status = 'active') AS total_deposits_amount
+""", prepare=False, readonly=True)
+
+
+# --- Ограничение частоты запросов (THROTTLE_BACKEND=postgres) ---
+
+# Token bucket одним запросом: пополнение по прошедшему времени и списание токена.
+# Пустой результат — токенов нет, запрос пользователя нужно отклонить.
+# $1 — пользователь, $2 — группа, $3 — емкость, $4 — токенов в секунду
+THROTTLE_ACQUIRE = register('throttle_acquire', """
+    INSERT INTO throttle_buckets AS b (user_id, bucket, tokens, updated_at, full_at)
+    VALUES ($1, $2, $3::float8 - 1, now(), now() + make_interval(secs => 1 / $4::float8))
+    ON CONFLICT (user_id, bucket) DO UPDATE
+    SET tokens = LEAST($3::float8, b.tokens + EXTRACT(EPOCH FROM now() - b.updated_at) * $4::float8) - 1,
+        updated_at = now(),
+        full_at = now() + make_interval(secs =>
+            ($3::float8 - LEAST($3::float8, b.tokens + EXTRACT(EPOCH FROM now() - b.updated_at) * $4::float8) + 1)
+            / $4::float8)
+    WHERE LEAST($3::float8, b.tokens + EXTRACT(EPOCH FROM now() - b.updated_at) * $4::float8) >= 1
+    RETURNING tokens
+""")
+
+# Полностью пополнившиеся корзины ничем не отличаются от отсутствующих
+EVICT_THROTTLE_BUCKETS = register('evict_throttle_buckets', """
+    DELETE FROM throttle_buckets WHERE full_at <= now()
+""", prepare=False)
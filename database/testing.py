@@ -0,0 +1,31 @@
+"""Помощники для тестов слоя базы данных"""
+from contextlib import contextmanager
+from typing import Iterator
+
+from database.context import QueryCounter, update_queries
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryCounter]:
+    """Считает запросы, выполненные внутри блока"""
+    counter = QueryCounter()
+    token = update_queries.set(counter)
+    try:
+        yield counter
+    finally:
+        update_queries.reset(token)
+
+
+@contextmanager
+def assert_max_queries(limit: int) -> Iterator[QueryCounter]:
+    """
+    Проверяет, что код внутри блока выполнил не больше limit запросов:
+
+        with assert_max_queries(3):
+            await referral_back_callback(callback)
+    """
+    with count_queries() as counter:
+        yield counter
+    if counter.count > limit:
+        shapes = '\n'.join(f"  {calls} x {shape}" for shape, calls in counter.shapes.most_common())
+        raise AssertionError(f"Expected at most {limit} queries, got {counter.count}:\n{shapes}")
@@ -0,0 +1,41 @@
+"""
+Выгрузка транзакций в CSV (gzip) из командной строки
+Для больших выгрузок, которые неудобно получать через бота
+"""
+import argparse
+import asyncio
+import logging
+from datetime import date
+from database.connection import db
+from services.export import export_transactions
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Экспорт транзакций в CSV (gzip)")
+    parser.add_argument("output", help="Путь к файлу, например transactions.csv.gz")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="Начальная дата (ГГГГ-ММ-ДД)")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, help="Конечная дата включительно (ГГГГ-ММ-ДД)")
+    parser.add_argument("--type", dest="transaction_type", help="Тип транзакции, например topup")
+    return parser.parse_args()
+
+
+async def run_export(args):
+    """Запускает выгрузку"""
+    try:
+        await db.create_pool()
+        rows = await export_transactions(
+            args.output, args.date_from, args.date_to, args.transaction_type
+        )
+        logger.info(f"Exported {rows} transactions to {args.output}")
+    finally:
+        await db.close_pool()
+
+
+if __name__ == '__main__':
+    asyncio.run(run_export(parse_args()))
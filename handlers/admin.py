@@ -1,11 +1,14 @@
+import asyncio
+import html
 import os
-from decimal import Decimal, InvalidOperation
-from datetime import datetime
-from aiogram import Router, F, Bot
-from aiogram.types import Message, CallbackQuery
-from aiogram.filters import Command, StateFilter
+import tempfile
+from datetime import datetime, date
+from aiogram import Router, F, Bot, flags
+from aiogram.types import Message, CallbackQuery, FSInputFile, BufferedInputFile
+from aiogram.filters import Command, CommandObject, StateFilter
 from aiogram.fsm.context import FSMContext
 
+from database import queries
 from database.connection import db
 from lexicon.lexicon_ru import LEXICON_RU
 from keyboards.keyboard_utils import (
@@ -16,6 +19,12 @@ from keyboards.keyboard_utils import (
 from states.states import AdminStates
 from config.config import conf
 from utils import format_balance
+from money import parse_amount
+from services.balances import credit_admin_topup
+from services.export import export_transactions
+from services.settings import settings
+from services.transactions import approve_transaction, reject_transaction
+from monitoring.profiler import profiler
 
 router = Router()
 
@@ -25,9 +34,7 @@ ADMIN_IDS = [int(id) for id in conf.ADMIN_IDS.split(",") if id] if conf.ADMIN_ID
 
 async def get_admin_password() -> str:
     """Получает пароль админки из БД или конфига"""
-    password = await db.fetchval(
-        "SELECT setting_value FROM admin_settings WHERE setting_key = 'admin_password'"
-    )
+    password = await settings.get('admin_password')
     return password or conf.ADMIN_PASSWORD
 
 
@@ -35,7 +42,7 @@ async def is_admin(user_id: int) -> bool:
     """Проверяет, является ли пользователь администратором"""
     if ADMIN_IDS and user_id in ADMIN_IDS:
         return True
-    user = await db.fetchrow("SELECT is_admin FROM users WHERE user_id = $1", user_id)
+    user = await db.fetchrow(queries.USER_IS_ADMIN, user_id)
     return user and user['is_admin']
 
 
@@ -50,6 +57,7 @@ async def cmd_admin(message: Message, state: FSMContext):
 
 
 @router.message(StateFilter(AdminStates.waiting_for_password))
+@flags.throttle('auth')
 async def process_admin_password(message: Message, state: FSMContext):
     """Проверка пароля админки"""
     password = await get_admin_password()
@@ -73,6 +81,12 @@ def format_datetime(dt) -> str:
     return str(dt)[:16] if len(str(dt)) > 16 else str(dt)
 
 
+async def get_unprocessable_reason(transaction_id: int) -> str:
+    """Текст ошибки, если решение по транзакции не применилось"""
+    exists = await db.fetchval(queries.TRANSACTION_EXISTS, transaction_id)
+    return "❌ Транзакция уже обработана" if exists else "❌ Транзакция не найдена"
+
+
 @router.callback_query(F.data == "admin_pending")
 async def admin_pending_callback(callback: CallbackQuery, bot: Bot):
     """Список ожидающих транзакций"""
@@ -80,14 +94,7 @@ async def admin_pending_callback(callback: CallbackQuery, bot: Bot):
         await callback.answer("❌ Нет доступа", show_alert=True)
         return
     
-    transactions = await db.fetch(
-        """SELECT t.*, u.username, u.full_name 
-           FROM transactions t
-           JOIN users u ON t.user_id = u.user_id
-           WHERE t.status = 'pending'
-           ORDER BY t.created_at DESC
-           LIMIT 20"""
-    )
+    transactions = await db.fetch(queries.PENDING_TRANSACTIONS)
     
     if not transactions:
         await callback.message.edit_text(
@@ -134,27 +141,15 @@ async def approve_transaction_callback(callback: CallbackQuery, bot: Bot):
     
     transaction_id = int(callback.data.split("_")[1])
     
-    transaction = await db.fetchrow(
-        "SELECT * FROM transactions WHERE transaction_id = $1",
-        transaction_id
-    )
+    # Смена статуса и изменение баланса — одним запросом, ровно один раз
+    transaction = await approve_transaction(transaction_id, callback.from_user.id)
     
     if not transaction:
-        await callback.answer("❌ Транзакция не найдена", show_alert=True)
+        await callback.answer(await get_unprocessable_reason(transaction_id), show_alert=True)
         return
     
-    if transaction['status'] != 'pending':
-        await callback.answer("❌ Транзакция уже обработана", show_alert=True)
-        return
-    
-    # Если это пополнение, начисляем баланс и отправляем сообщение пользователю
+    # Если это пополнение, отправляем сообщение пользователю о зачислении
     if transaction['transaction_type'] == 'topup':
-        await db.execute(
-            "UPDATE users SET balance = balance + $1 WHERE user_id = $2",
-            transaction['amount'], transaction['user_id']
-        )
-        
-        # Отправляем сообщение пользователю
         try:
             await bot.send_message(
                 transaction['user_id'],
@@ -176,14 +171,6 @@ async def approve_transaction_callback(callback: CallbackQuery, bot: Bot):
         except Exception:
             pass
     
-    # Обновляем статус транзакции
-    await db.execute(
-        """UPDATE transactions 
-           SET status = 'completed', admin_id = $1 
-           WHERE transaction_id = $2""",
-        callback.from_user.id, transaction_id
-    )
-    
     await callback.message.edit_text(
         f"✅ Транзакция #{transaction_id} одобрена",
         reply_markup=get_admin_back_keyboard()
@@ -200,10 +187,7 @@ async def reject_transaction_callback(callback: CallbackQuery, state: FSMContext
     
     transaction_id = int(callback.data.split("_")[1])
     
-    transaction = await db.fetchrow(
-        "SELECT * FROM transactions WHERE transaction_id = $1",
-        transaction_id
-    )
+    transaction = await db.fetchrow(queries.TRANSACTION_BY_ID, transaction_id)
     
     if not transaction:
         await callback.answer("❌ Транзакция не найдена", show_alert=True)
@@ -258,29 +242,16 @@ async def process_reject_reason(message: Message, state: FSMContext, bot: Bot):
         await message.answer("❌ Причина не может быть пустой. Введите причину отклонения:")
         return
     
-    transaction = await db.fetchrow(
-        "SELECT * FROM transactions WHERE transaction_id = $1",
-        transaction_id
-    )
+    # Смена статуса и возврат средств — одним запросом, ровно один раз
+    transaction = await reject_transaction(transaction_id, message.from_user.id, reason)
     
     if not transaction:
-        await message.answer("❌ Транзакция не найдена")
-        await state.clear()
-        return
-    
-    if transaction['status'] != 'pending':
-        await message.answer("❌ Транзакция уже обработана")
+        await message.answer(await get_unprocessable_reason(transaction_id))
         await state.clear()
         return
     
-    # Если это вывод, возвращаем средства на баланс
+    # Если это вывод, сообщаем пользователю о возврате средств и причине
     if transaction['transaction_type'] == 'withdraw':
-        await db.execute(
-            "UPDATE users SET balance = balance + $1 WHERE user_id = $2",
-            transaction['amount'], transaction['user_id']
-        )
-        
-        # Отправляем сообщение пользователю с причиной
         try:
             await bot.send_message(
                 transaction['user_id'],
@@ -303,14 +274,6 @@ async def process_reject_reason(message: Message, state: FSMContext, bot: Bot):
         except Exception:
             pass
     
-    # Обновляем статус транзакции и сохраняем причину в описании
-    await db.execute(
-        """UPDATE transactions 
-           SET status = 'rejected', admin_id = $1, description = $3
-           WHERE transaction_id = $2""",
-        message.from_user.id, transaction_id, f"{transaction['description'] or ''}\nПричина отклонения: {reason}"
-    )
-    
     await message.answer(
         f"✅ Транзакция #{transaction_id} отклонена.\nПричина отправлена пользователю.",
         reply_markup=get_admin_back_keyboard()
@@ -342,14 +305,14 @@ async def process_admin_username(message: Message, state: FSMContext):
     try:
         user_id = int(text)
         # Ищем по user_id
-        user = await db.fetchrow("SELECT * FROM users WHERE user_id = $1", user_id)
+        user = await db.fetchrow(queries.USER_BY_ID, user_id)
         if not user:
             await message.answer(f"❌ Пользователь с ID {user_id} не найден")
             return
     except ValueError:
         # Не число, значит это username
         username = text
-        user = await db.fetchrow("SELECT * FROM users WHERE username = $1", username)
+        user = await db.fetchrow(queries.USER_BY_USERNAME, username)
         if not user:
             await message.answer(f"❌ Пользователь с username @{username} не найден")
             return
@@ -370,22 +333,12 @@ async def process_admin_username(message: Message, state: FSMContext):
 async def process_admin_amount(message: Message, state: FSMContext, bot: Bot):
     """Обработка суммы для начисления администратором"""
     try:
-        amount = Decimal(message.text.replace(',', '.'))
+        amount = parse_amount(message.text)
         data = await state.get_data()
         user_id = data['admin_user_id']
         
-        # Начисляем баланс
-        await db.execute(
-            "UPDATE users SET balance = balance + $1 WHERE user_id = $2",
-            amount, user_id
-        )
-        
-        # Создаем транзакцию
-        await db.execute(
-            """INSERT INTO transactions (user_id, transaction_type, amount, status, description, admin_id)
-               VALUES ($1, 'admin_topup', $2, 'completed', 'Пополнение администратором', $3)""",
-            user_id, amount, message.from_user.id
-        )
+        # Начисляем баланс и создаем транзакцию
+        await credit_admin_topup(user_id, amount, message.from_user.id)
         
         # Отправляем сообщение пользователю
         try:
@@ -402,7 +355,7 @@ async def process_admin_amount(message: Message, state: FSMContext, bot: Bot):
         )
         await state.clear()
         
-    except (ValueError, InvalidOperation):
+    except ValueError:
         await message.answer("❌ Неверный формат суммы. Введите число, например: 100")
 
 
@@ -413,9 +366,7 @@ async def admin_news_callback(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Нет доступа", show_alert=True)
         return
     
-    content = await db.fetchval(
-        "SELECT setting_value FROM admin_settings WHERE setting_key = 'news_content'"
-    )
+    content = await settings.get('news_content')
     raw = (content or "").strip() or "— пусто —"
     # Экранируем для отображения в HTML-превью
     current = raw[:500].replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
@@ -443,13 +394,7 @@ async def process_news_message(message: Message, state: FSMContext):
     
     new_content = message.text or message.caption or ""
     
-    await db.execute(
-        """INSERT INTO admin_settings (setting_key, setting_value) 
-           VALUES ('news_content', $1)
-           ON CONFLICT (setting_key) 
-           DO UPDATE SET setting_value = $1, updated_at = CURRENT_TIMESTAMP""",
-        new_content
-    )
+    await settings.set('news_content', new_content)
     
     await message.answer(
         "✅ Текст новостей обновлён. Пользователи видят новый контент при открытии раздела «Новости».",
@@ -459,6 +404,8 @@ async def process_news_message(message: Message, state: FSMContext):
 
 
 @router.callback_query(F.data == "admin_stats")
+@flags.throttle('heavy')
+@flags.priority('low')
 async def admin_stats_callback(callback: CallbackQuery):
     """Статистика системы"""
     if not await is_admin(callback.from_user.id):
@@ -466,12 +413,11 @@ async def admin_stats_callback(callback: CallbackQuery):
         return
     
     # Общая статистика
-    total_users = await db.fetchval("SELECT COUNT(*) FROM users")
-    total_deposits = await db.fetchval("SELECT COUNT(*) FROM deposits WHERE status = 'active'")
-    total_balance = await db.fetchval("SELECT COALESCE(SUM(balance), 0) FROM users")
-    total_deposits_amount = await db.fetchval(
-        "SELECT COALESCE(SUM(current_balance), 0) FROM deposits WHERE status = 'active'"
-    )
+    stats = await db.fetchrow(queries.ADMIN_STATS)
+    total_users = stats['total_users']
+    total_deposits = stats['total_deposits']
+    total_balance = stats['total_balance']
+    total_deposits_amount = stats['total_deposits_amount']
     
     stats_text = f"""
 📊 <b>Статистика системы</b>
@@ -489,6 +435,72 @@ async def admin_stats_callback(callback: CallbackQuery):
     await callback.answer()
 
 
+def parse_export_filters(text: str):
+    """
+    Разбирает фильтры выгрузки: «ГГГГ-ММ-ДД ГГГГ-ММ-ДД [тип]».
+    Вместо даты можно указать «-» (без ограничения), «все» — без фильтров.
+    """
+    parts = text.split()
+    if not parts or parts[0].lower() == 'все':
+        return None, None, parts[1] if len(parts) > 1 else None
+    if len(parts) < 2 or len(parts) > 3:
+        raise ValueError("wrong number of filters")
+    date_from = None if parts[0] == '-' else date.fromisoformat(parts[0])
+    date_to = None if parts[1] == '-' else date.fromisoformat(parts[1])
+    transaction_type = parts[2] if len(parts) == 3 else None
+    return date_from, date_to, transaction_type
+
+
+@router.callback_query(F.data == "admin_export")
+async def admin_export_callback(callback: CallbackQuery, state: FSMContext):
+    """Экспорт транзакций - запрос фильтров"""
+    if not await is_admin(callback.from_user.id):
+        await callback.answer("❌ Нет доступа", show_alert=True)
+        return
+    
+    await callback.message.edit_text(
+        "📤 <b>Экспорт транзакций</b>\n\n"
+        "Введите период и (необязательно) тип транзакции:\n"
+        "<code>2024-01-01 2024-01-31 topup</code>\n\n"
+        "Вместо даты можно указать <code>-</code>, для выгрузки всех транзакций отправьте <code>все</code>.",
+        reply_markup=get_admin_back_keyboard()
+    )
+    await state.set_state(AdminStates.waiting_for_export_filters)
+    await callback.answer()
+
+
+@router.message(StateFilter(AdminStates.waiting_for_export_filters))
+@flags.throttle('heavy')
+@flags.priority('low')
+async def process_export_filters(message: Message, state: FSMContext, bot: Bot):
+    """Выгрузка транзакций в CSV (gzip) и отправка документом"""
+    if not await is_admin(message.from_user.id):
+        await message.answer("❌ Нет доступа")
+        await state.clear()
+        return
+    
+    try:
+        date_from, date_to, transaction_type = parse_export_filters(message.text or "")
+    except ValueError:
+        await message.answer("❌ Неверный формат. Пример: <code>2024-01-01 2024-01-31 topup</code>")
+        return
+    
+    await state.clear()
+    fd, path = tempfile.mkstemp(prefix="transactions_", suffix=".csv.gz")
+    os.close(fd)
+    try:
+        rows = await export_transactions(path, date_from, date_to, transaction_type)
+        filename = f"transactions_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv.gz"
+        await bot.send_document(
+            message.chat.id,
+            FSInputFile(path, filename=filename),
+            caption=f"📤 Выгружено транзакций: {rows}",
+            reply_markup=get_admin_back_keyboard()
+        )
+    finally:
+        os.remove(path)
+
+
 @router.callback_query(F.data == "back_to_admin")
 async def back_to_admin_callback(callback: CallbackQuery, state: FSMContext):
     """Возврат в меню админки"""
@@ -561,13 +573,7 @@ async def process_new_password(message: Message, state: FSMContext, bot: Bot):
         return
     
     # Сохраняем новый пароль в БД
-    await db.execute(
-        """INSERT INTO admin_settings (setting_key, setting_value) 
-           VALUES ('admin_password', $1)
-           ON CONFLICT (setting_key) 
-           DO UPDATE SET setting_value = $1, updated_at = CURRENT_TIMESTAMP""",
-        new_password
-    )
+    await settings.set('admin_password', new_password)
     
     await bot.send_message(
         message.chat.id,
@@ -575,3 +581,86 @@ async def process_new_password(message: Message, state: FSMContext, bot: Bot):
         reply_markup=get_admin_keyboard()
     )
     await state.clear()
+
+
+# Задача, которая остановит профилирование по таймеру
+_profiling_timer = None
+
+
+async def send_profile_result(bot: Bot, chat_id: int):
+    """Останавливает профилирование и отправляет результат документом"""
+    result = profiler.stop()
+    if result is None:
+        await bot.send_message(chat_id, "ℹ️ Профилирование не запущено")
+        return
+    summary = html.escape(result.summary[:3500])
+    await bot.send_message(
+        chat_id,
+        f"🔬 <b>Профиль ({result.mode}, {result.duration:.0f} с)</b>\n\n<pre>{summary}</pre>"
+    )
+    for filename, content in result.files:
+        await bot.send_document(chat_id, BufferedInputFile(content, filename=filename))
+
+
+async def _stop_profiling_later(bot: Bot, chat_id: int, seconds: float):
+    await asyncio.sleep(seconds)
+    await send_profile_result(bot, chat_id)
+
+
+async def start_profiling(bot: Bot, chat_id: int, seconds: float, mode: str) -> str:
+    """Запускает профилирование на seconds секунд; возвращает текст ответа"""
+    global _profiling_timer
+    if profiler.running:
+        return "⚠️ Профилирование уже запущено. Остановить: /profile_stop"
+    profiler.start(mode, conf.PROFILER_INTERVAL)
+    _profiling_timer = asyncio.create_task(_stop_profiling_later(bot, chat_id, seconds))
+    return (
+        f"🔬 Профилирование ({mode}) запущено на {seconds:.0f} с.\n"
+        f"Результат придет сюда; остановить раньше: /profile_stop"
+    )
+
+
+@router.message(Command('profile_start'))
+async def cmd_profile_start(message: Message, command: CommandObject, bot: Bot):
+    """Запуск профилирования: /profile_start [секунды] [sampling|cprofile]"""
+    if not await is_admin(message.from_user.id):
+        await message.answer("❌ Нет доступа")
+        return
+    
+    args = (command.args or "").split()
+    try:
+        seconds = float(args[0]) if args else conf.PROFILER_DEFAULT_SECONDS
+    except ValueError:
+        await message.answer("❌ Использование: /profile_start [секунды] [sampling|cprofile]")
+        return
+    mode = args[1] if len(args) > 1 else 'sampling'
+    if mode not in ('sampling', 'cprofile'):
+        await message.answer("❌ Режим: sampling или cprofile")
+        return
+    seconds = max(1.0, min(seconds, conf.PROFILER_MAX_SECONDS))
+    
+    await message.answer(await start_profiling(bot, message.chat.id, seconds, mode))
+
+
+@router.message(Command('profile_stop'))
+async def cmd_profile_stop(message: Message, bot: Bot):
+    """Досрочная остановка профилирования"""
+    if not await is_admin(message.from_user.id):
+        await message.answer("❌ Нет доступа")
+        return
+    
+    if _profiling_timer is not None and not _profiling_timer.done():
+        _profiling_timer.cancel()
+    await send_profile_result(bot, message.chat.id)
+
+
+@router.callback_query(F.data == "admin_profile")
+async def admin_profile_callback(callback: CallbackQuery, bot: Bot):
+    """Профилирование из настроек админки (режим sampling, время по умолчанию)"""
+    if not await is_admin(callback.from_user.id):
+        await callback.answer("❌ Нет доступа", show_alert=True)
+        return
+    
+    text = await start_profiling(bot, callback.message.chat.id, conf.PROFILER_DEFAULT_SECONDS, 'sampling')
+    await callback.message.answer(text)
+    await callback.answer()
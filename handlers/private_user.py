@@ -1,13 +1,14 @@
 import secrets
-from decimal import Decimal, InvalidOperation
+from decimal import Decimal
 from datetime import datetime
 from typing import Optional
 
-from aiogram import Router, F, Bot
+from aiogram import Router, F, Bot, flags
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 
+from database import queries
 from database.connection import db
 from database.models import User, Deposit, Transaction
 from lexicon.lexicon_ru import LEXICON_RU
@@ -19,12 +20,17 @@ from keyboards.flow_kb import get_cancel_keyboard
 from states.states import DepositStates, TopUpStates, WithdrawStates
 from config.config import conf
 from utils import format_balance
+from money import parse_amount, to_db
+from services.deposits import create_deposit
+from services.settings import settings
+from services.withdrawals import reserve_withdrawal
 
 router = Router()
 
 # Константы
-MIN_DEPOSIT = Decimal('10')
-MIN_TOPUP = Decimal('10')
+MIN_DEPOSIT = parse_amount('10')
+MIN_TOPUP = parse_amount('10')
+MIN_WITHDRAW = parse_amount('10')
 REFERRAL_BONUS_PERCENT = Decimal('5')  # 5% от суммы депозита реферала
 DEFAULT_INTEREST_RATE = Decimal('1')  # 1% в день
 USDT_ADDRESS = conf.USDT_ADDRESS or "TYourUSDTAddressHere"
@@ -32,22 +38,18 @@ USDT_ADDRESS = conf.USDT_ADDRESS or "TYourUSDTAddressHere"
 
 async def get_or_create_user(user_id: int, username: str = None, full_name: str = None, referred_by: int = None, bot: Optional[Bot] = None) -> User:
     """Получает пользователя из БД или создает нового"""
-    user = await db.fetchrow(
-        "SELECT * FROM users WHERE user_id = $1",
-        user_id
-    )
+    user = await db.fetchrow(queries.USER_BY_ID, user_id)
     
     if user:
         return User.from_row(user)
     
     # Генерируем уникальный реферальный код
     referral_code = secrets.token_urlsafe(8)[:8].upper()
-    while await db.fetchval("SELECT user_id FROM users WHERE referral_code = $1", referral_code):
+    while await db.fetchval(queries.USER_ID_BY_REFERRAL_CODE, referral_code):
         referral_code = secrets.token_urlsafe(8)[:8].upper()
     
     await db.execute(
-        """INSERT INTO users (user_id, username, full_name, referral_code, referred_by)
-           VALUES ($1, $2, $3, $4, $5)""",
+        queries.CREATE_USER,
         user_id, username, full_name, referral_code, referred_by
     )
     
@@ -80,10 +82,7 @@ async def cmd_start(message: Message, state: FSMContext, bot: Bot):
     referred_by = None
     if len(message.text.split()) > 1:
         ref_code = message.text.split()[1]
-        referrer = await db.fetchrow(
-            "SELECT user_id FROM users WHERE referral_code = $1",
-            ref_code
-        )
+        referrer = await db.fetchrow(queries.USER_ID_BY_REFERRAL_CODE, ref_code)
         if referrer:
             referred_by = referrer['user_id']
     
@@ -109,13 +108,12 @@ async def cmd_profile(message: Message):
     
     # Подсчитываем активные депозиты
     active_deposits = await db.fetchval(
-        "SELECT COUNT(*) FROM deposits WHERE user_id = $1 AND status = 'active'",
-        message.from_user.id
+        queries.COUNT_ACTIVE_DEPOSITS, message.from_user.id
     ) or 0
     
     # Подсчитываем рефералов
     referrals_count = await db.fetchval(
-        "SELECT COUNT(*) FROM users WHERE referred_by = $1",
+        queries.COUNT_REFERRALS,
         message.from_user.id
     ) or 0
     
@@ -135,7 +133,10 @@ async def cmd_balance(message: Message):
     """Показывает баланс пользователя"""
     user = await get_or_create_user(message.from_user.id, message.from_user.username, message.from_user.full_name)
     await message.answer(
-        LEXICON_RU['balance'].format(balance=format_balance(user.balance))
+        LEXICON_RU['balance'].format(
+            balance=format_balance(user.balance),
+            reserved=format_balance(user.reserved_balance)
+        )
     )
 
 
@@ -150,6 +151,7 @@ async def cmd_deposits(message: Message):
 
 
 @router.callback_query(F.data == "create_deposit")
+@flags.throttle('money')
 async def create_deposit_callback(callback: CallbackQuery, state: FSMContext):
     """Начало создания депозита"""
     await callback.message.edit_text(
@@ -161,10 +163,11 @@ async def create_deposit_callback(callback: CallbackQuery, state: FSMContext):
 
 
 @router.message(StateFilter(DepositStates.waiting_for_amount))
+@flags.throttle('money')
 async def process_deposit_amount(message: Message, state: FSMContext):
     """Обработка суммы депозита"""
     try:
-        amount = Decimal(message.text.replace(',', '.'))
+        amount = parse_amount(message.text)
         
         if amount < MIN_DEPOSIT:
             await message.answer(
@@ -172,46 +175,15 @@ async def process_deposit_amount(message: Message, state: FSMContext):
             )
             return
         
-        user = await get_or_create_user(message.from_user.id, message.from_user.username, message.from_user.full_name)
+        # Списание, создание депозита и реферальный бонус — одной атомарной операцией
+        deposit_id = await create_deposit(
+            message.from_user.id, amount, DEFAULT_INTEREST_RATE, REFERRAL_BONUS_PERCENT
+        )
         
-        if user.balance < amount:
+        if deposit_id is None:
             await message.answer(LEXICON_RU['not_enough_balance'])
             return
         
-        # Создаем депозит
-        deposit_id = await db.fetchval(
-            """INSERT INTO deposits (user_id, amount, interest_rate, current_balance, status)
-               VALUES ($1, $2, $3, $4, 'active')
-               RETURNING deposit_id""",
-            message.from_user.id, amount, DEFAULT_INTEREST_RATE, amount
-        )
-        
-        # Списываем средства с баланса
-        await db.execute(
-            "UPDATE users SET balance = balance - $1 WHERE user_id = $2",
-            amount, message.from_user.id
-        )
-        
-        # Создаем транзакцию
-        await db.execute(
-            """INSERT INTO transactions (user_id, transaction_type, amount, status, description, deposit_id)
-               VALUES ($1, 'deposit_created', $2, 'completed', 'Создание депозита', $3)""",
-            message.from_user.id, amount, deposit_id
-        )
-        
-        # Начисляем реферальный бонус, если есть реферер
-        if user.referred_by:
-            bonus_amount = amount * REFERRAL_BONUS_PERCENT / 100
-            await db.execute(
-                "UPDATE users SET balance = balance + $1 WHERE user_id = $2",
-                bonus_amount, user.referred_by
-            )
-            await db.execute(
-                """INSERT INTO referral_bonuses (referrer_id, referred_id, amount)
-                   VALUES ($1, $2, $3)""",
-                user.referred_by, message.from_user.id, bonus_amount
-            )
-        
         await message.answer(
             LEXICON_RU['deposit_created'].format(
                 amount=amount,
@@ -221,17 +193,15 @@ async def process_deposit_amount(message: Message, state: FSMContext):
         )
         await state.clear()
         
-    except (ValueError, InvalidOperation):
+    except ValueError:
         await message.answer("❌ Неверный формат суммы. Введите число, например: 100")
 
 
 @router.callback_query(F.data == "list_deposits")
+@flags.throttle('heavy')
 async def list_deposits_callback(callback: CallbackQuery):
     """Список депозитов пользователя"""
-    deposits = await db.fetch(
-        "SELECT * FROM deposits WHERE user_id = $1 ORDER BY created_at DESC",
-        callback.from_user.id
-    )
+    deposits = await db.fetch(queries.USER_DEPOSITS, callback.from_user.id)
     
     if not deposits:
         await callback.message.edit_text(
@@ -269,10 +239,11 @@ async def cmd_topup(message: Message, state: FSMContext):
 
 
 @router.message(StateFilter(TopUpStates.waiting_for_amount))
+@flags.throttle('money')
 async def process_topup_amount(message: Message, state: FSMContext):
     """Обработка суммы пополнения"""
     try:
-        amount = Decimal(message.text.replace(',', '.'))
+        amount = parse_amount(message.text)
         
         if amount < MIN_TOPUP:
             await message.answer(
@@ -284,10 +255,8 @@ async def process_topup_amount(message: Message, state: FSMContext):
         
         # Создаем транзакцию на пополнение со статусом 'pending'
         transaction_id = await db.fetchval(
-            """INSERT INTO transactions (user_id, transaction_type, amount, status, description)
-               VALUES ($1, 'topup', $2, 'pending', $3)
-               RETURNING transaction_id""",
-            message.from_user.id, amount, f"Пополнение баланса на сумму {amount} USDT"
+            queries.CREATE_TOPUP,
+            message.from_user.id, to_db(amount), f"Пополнение баланса на сумму {amount} USDT"
         )
         
         await message.answer(
@@ -300,7 +269,7 @@ async def process_topup_amount(message: Message, state: FSMContext):
         )
         await state.clear()
         
-    except (ValueError, InvalidOperation):
+    except ValueError:
         await message.answer("❌ Неверный формат суммы. Введите число, например: 100")
 
 
@@ -316,18 +285,21 @@ async def cmd_withdraw(message: Message, state: FSMContext):
 
 
 @router.message(StateFilter(WithdrawStates.waiting_for_amount))
+@flags.throttle('money')
 async def process_withdraw_amount(message: Message, state: FSMContext):
     """Обработка суммы вывода"""
     try:
-        amount = Decimal(message.text.replace(',', '.'))
+        amount = parse_amount(message.text)
         user = await get_or_create_user(message.from_user.id, message.from_user.username, message.from_user.full_name)
         
+        # Предварительная проверка для подсказки пользователю;
+        # окончательная проверка баланса — при резервировании средств
         if user.balance < amount:
             await message.answer(LEXICON_RU['not_enough_balance'])
             return
         
-        if amount < Decimal('10'):
-            await message.answer(LEXICON_RU['invalid_amount'].format(min=10))
+        if amount < MIN_WITHDRAW:
+            await message.answer(LEXICON_RU['invalid_amount'].format(min=MIN_WITHDRAW))
             return
         
         await state.update_data(withdraw_amount=amount)
@@ -337,11 +309,12 @@ async def process_withdraw_amount(message: Message, state: FSMContext):
         )
         await state.set_state(WithdrawStates.waiting_for_address)
         
-    except (ValueError, InvalidOperation):
+    except ValueError:
         await message.answer("❌ Неверный формат суммы. Введите число, например: 100")
 
 
 @router.message(StateFilter(WithdrawStates.waiting_for_address))
+@flags.throttle('money')
 async def process_withdraw_address(message: Message, state: FSMContext):
     """Обработка адреса для вывода"""
     data = await state.get_data()
@@ -353,21 +326,13 @@ async def process_withdraw_address(message: Message, state: FSMContext):
         await message.answer("❌ Неверный формат адреса USDT (TRC20). Адрес должен начинаться с T и иметь длину 34 символа.")
         return
     
-    user = await get_or_create_user(message.from_user.id, message.from_user.username, message.from_user.full_name)
+    # Резервируем средства и создаем заявку одной операцией с проверкой баланса
+    transaction_id = await reserve_withdrawal(message.from_user.id, amount, address)
     
-    # Создаем транзакцию на вывод
-    transaction_id = await db.fetchval(
-        """INSERT INTO transactions (user_id, transaction_type, amount, status, description)
-           VALUES ($1, 'withdraw', $2, 'pending', $3)
-           RETURNING transaction_id""",
-        message.from_user.id, amount, f"Вывод на адрес {address}"
-    )
-    
-    # Резервируем средства (можно вычесть сразу или оставить на балансе до подтверждения)
-    await db.execute(
-        "UPDATE users SET balance = balance - $1 WHERE user_id = $2",
-        amount, message.from_user.id
-    )
+    if transaction_id is None:
+        await message.answer(LEXICON_RU['not_enough_balance'], reply_markup=get_main_keyboard())
+        await state.clear()
+        return
     
     await message.answer(
         LEXICON_RU['withdraw_request'].format(
@@ -383,9 +348,7 @@ async def process_withdraw_address(message: Message, state: FSMContext):
 @router.message(Command('news'))
 async def cmd_news(message: Message):
     """Показ новостей (одно сообщение, редактируется админом)"""
-    content = await db.fetchval(
-        "SELECT setting_value FROM admin_settings WHERE setting_key = 'news_content'"
-    )
+    content = await settings.get('news_content')
     if not content or not content.strip():
         text = f"{LEXICON_RU['news_title']}\n\n{LEXICON_RU['news_empty']}"
     else:
@@ -395,17 +358,19 @@ async def cmd_news(message: Message):
 
 @router.message(F.text == "👥 Реферальная программа")
 @router.message(Command('referral'))
+@flags.throttle('heavy')
+@flags.priority('low')
 async def cmd_referral(message: Message):
     """Реферальная программа"""
     user = await get_or_create_user(message.from_user.id, message.from_user.username, message.from_user.full_name)
     
     referrals_count = await db.fetchval(
-        "SELECT COUNT(*) FROM users WHERE referred_by = $1",
+        queries.COUNT_REFERRALS,
         message.from_user.id
     ) or 0
     
     total_bonuses = await db.fetchval(
-        "SELECT COALESCE(SUM(amount), 0) FROM referral_bonuses WHERE referrer_id = $1",
+        queries.SUM_REFERRAL_BONUSES,
         message.from_user.id
     ) or 0
     
@@ -434,13 +399,15 @@ def _format_referral_date(dt) -> str:
 
 
 @router.callback_query(F.data.startswith("referrals_page_"))
+@flags.throttle('heavy')
+@flags.priority('low')
 async def referrals_list_callback(callback: CallbackQuery):
     """Список рефералов с пагинацией"""
     page = int(callback.data.split("_")[-1])
     referrer_id = callback.from_user.id
     
     total = await db.fetchval(
-        "SELECT COUNT(*) FROM users WHERE referred_by = $1",
+        queries.COUNT_REFERRALS,
         referrer_id
     ) or 0
     
@@ -452,11 +419,7 @@ async def referrals_list_callback(callback: CallbackQuery):
     page = max(0, min(page, total_pages - 1))
     
     referrals = await db.fetch(
-        """SELECT user_id, username, full_name, created_at 
-           FROM users 
-           WHERE referred_by = $1 
-           ORDER BY created_at DESC 
-           LIMIT $2 OFFSET $3""",
+        queries.REFERRALS_PAGE,
         referrer_id, REFERRALS_PER_PAGE, page * REFERRALS_PER_PAGE
     )
     
@@ -485,11 +448,11 @@ async def referral_back_callback(callback: CallbackQuery):
         callback.from_user.full_name
     )
     referrals_count = await db.fetchval(
-        "SELECT COUNT(*) FROM users WHERE referred_by = $1",
+        queries.COUNT_REFERRALS,
         callback.from_user.id
     ) or 0
     total_bonuses = await db.fetchval(
-        "SELECT COALESCE(SUM(amount), 0) FROM referral_bonuses WHERE referrer_id = $1",
+        queries.SUM_REFERRAL_BONUSES,
         callback.from_user.id
     ) or 0
     bot_username = (await callback.bot.get_me()).username
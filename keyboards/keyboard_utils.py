@@ -33,6 +33,7 @@ def get_admin_keyboard() -> InlineKeyboardMarkup:
     builder.add(InlineKeyboardButton(text="➕ Начислить баланс", callback_data="admin_add_balance"))
     builder.add(InlineKeyboardButton(text="📰 Новости", callback_data="admin_news"))
     builder.add(InlineKeyboardButton(text="📊 Статистика", callback_data="admin_stats"))
+    builder.add(InlineKeyboardButton(text="📤 Экспорт транзакций", callback_data="admin_export"))
     builder.add(InlineKeyboardButton(text="⚙️ Настройки", callback_data="admin_settings"))
     builder.add(InlineKeyboardButton(text="🚪 Выйти из админки", callback_data="exit_admin"))
     builder.adjust(1)
@@ -72,6 +73,7 @@ def get_admin_settings_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура настроек админки"""
     builder = InlineKeyboardBuilder()
     builder.add(InlineKeyboardButton(text="🔑 Изменить пароль", callback_data="admin_change_password"))
+    builder.add(InlineKeyboardButton(text="🔬 Профилирование", callback_data="admin_profile"))
     builder.add(InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_admin"))
     builder.adjust(1)
     return builder.as_markup()
@@ -16,7 +16,8 @@ LEXICON_RU = {
                'Поделитесь своим реферальным кодом с друзьями и получайте бонусы!',
     
     'balance': '💰 <b>Ваш баланс</b>\n\n'
-               'Текущий баланс: <b>{balance} USDT</b>',
+               'Текущий баланс: <b>{balance} USDT</b>\n'
+               'В обработке (вывод): {reserved} USDT',
     
     'deposit_menu': '📈 <b>Депозиты</b>\n\n'
                     'Выберите действие:',
@@ -69,6 +70,8 @@ LEXICON_RU = {
     
     'unknown_command': '❌ Неизвестная команда. Используйте /start для начала работы.',
     'error': '❌ Произошла ошибка. Попробуйте позже.',
+    'throttled': '⏳ Слишком много запросов. Подождите немного.',
+    'db_busy': '⏳ Сервис сейчас перегружен. Попробуйте через минуту.',
     'not_enough_balance': '❌ Недостаточно средств на балансе.',
     'invalid_amount': '❌ Неверная сумма. Минимум: {min} USDT',
     'no_deposits': 'У вас пока нет депозитов.',
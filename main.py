@@ -1,16 +1,39 @@
+import time
+
+# Отсчет времени старта — до тяжелых импортов
+PROCESS_STARTED = time.perf_counter()
+
 import asyncio
 import logging
+from typing import List, Optional
 
 from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.base import BaseSession
+from aiogram.client.telegram import TelegramAPIServer
 
 from config.config import conf
 from keyboards.set_menu import set_main_menu
 from database.connection import db
-from database.db import create_tables
-from handlers import private_user, admin
+from database.migrations import migrate
 from middlewares.database import DatabaseMiddleware
+from middlewares.load_shedding import LoadSheddingMiddleware
+from middlewares.metrics import UpdateMetricsMiddleware, HandlerMetricsMiddleware, BotApiMetricsMiddleware
+from middlewares.scheduler import UpdateScheduler
+from middlewares.shutdown import DrainMiddleware, DrainRequestMiddleware
+from middlewares.throttling import ThrottlingMiddleware
+from middlewares.tracing import TracingMiddleware, TracingRequestMiddleware
+from monitoring.loop import LoopMonitor
+from monitoring.server import health, start_monitoring_server
+from monitoring.tracing import configure_tracing, tracer
+from services.balances import compact_balance_deltas, run_balance_compaction
+from services.settings import settings
+from services.throttling import create_buckets, parse_rates
+from shutdown import drainer
+from startup import Startup
 
 # Настройка логирования
 logging.basicConfig(
@@ -21,39 +44,145 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-async def main():
-    logger.info("Starting bot...")
+def create_bot(session: Optional[BaseSession] = None, token: Optional[str] = None) -> Bot:
+    """Бот с middleware исходящих запросов к Bot API"""
+    if session is None and conf.BOT_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(conf.BOT_API_URL))
+    bot = Bot(
+        token=token or conf.BOT_TOKEN,
+        session=session,
+        default=DefaultBotProperties(parse_mode='HTML')
+    )
+    bot.session.middleware(BotApiMetricsMiddleware())
+    bot.session.middleware(TracingRequestMiddleware())
+    bot.session.middleware(DrainRequestMiddleware())
+    return bot
 
-    # Подключаемся к базе данных
-    await db.create_pool()
-    logger.info("Database connection established")
 
-    # Создаем таблицы в БД, если их нет
-    logger.info("Creating database tables if not exist...")
-    await create_tables()
-    logger.info("Database tables checked/created.")
+def import_routers() -> List:
+    """
+    Импортирует модули обработчиков. Вынесено из импорта main: при запуске
+    выполняется в потоке, параллельно с подключением к БД и Bot API
+    """
+    from handlers import admin, private_user
+    return [private_user.router, admin.router]
 
-    storage = MemoryStorage()
 
-    # Инициализируем бота и диспетчера
-    bot = Bot(token=conf.BOT_TOKEN, default=DefaultBotProperties(parse_mode='HTML'))
-    dp = Dispatcher(storage=storage)
+def create_dispatcher(storage: Optional[BaseStorage] = None) -> Dispatcher:
+    """Диспетчер со всеми middleware и роутерами (используется и в бенчмарках)"""
+    dp = Dispatcher(storage=storage or MemoryStorage())
 
-    # Регистрируем middleware
+    # Регистрируем middleware. Сначала outer на апдейт: планировщик, учет для остановки, метрики.
+    # Затем на сообщения и callback'и: tracing (первым, чтобы охватить остальные), ограничение
+    # частоты, сброс нагрузки, БД, метрики обработчиков
+    if conf.SCHEDULER_CONCURRENCY:
+        # Первым: остальные middleware и обработчик выполняются уже в очереди планировщика
+        dp.update.outer_middleware(UpdateScheduler(conf.SCHEDULER_CONCURRENCY, conf.SCHEDULER_MAX_QUEUE, dp))
+    dp.update.outer_middleware(DrainMiddleware())
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    dp.message.middleware(TracingMiddleware())
+    dp.callback_query.middleware(TracingMiddleware())
+    rates = parse_rates(conf.THROTTLE_RATES)
+    if rates:
+        throttling = ThrottlingMiddleware(
+            create_buckets(conf.THROTTLE_BACKEND, conf.THROTTLE_SWEEP_INTERVAL),
+            rates, conf.THROTTLE_NOTICE_INTERVAL
+        )
+        dp.message.middleware(throttling)
+        dp.callback_query.middleware(throttling)
+    dp.message.middleware(LoadSheddingMiddleware())
+    dp.callback_query.middleware(LoadSheddingMiddleware())
     dp.message.middleware(DatabaseMiddleware())
     dp.callback_query.middleware(DatabaseMiddleware())
+    dp.message.middleware(HandlerMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
 
     # Регистрируем роутеры
-    dp.include_router(private_user.router)
-    dp.include_router(admin.router)
+    dp.include_routers(*import_routers())
+    return dp
+
+
+async def main():
+    logger.info("Starting bot...")
+
+    # Метрики и health-check доступны с самого старта; готовность — после инициализации
+    health.check = lambda: db.pool is not None
+    monitoring = await start_monitoring_server(conf.METRICS_HOST, conf.METRICS_PORT)
+    configure_tracing(
+        conf.TRACING_EXPORTER, conf.TRACING_SAMPLE_RATE, conf.TRACING_JSONL_PATH,
+        conf.TRACING_OTLP_ENDPOINT, conf.TRACING_SERVICE_NAME
+    )
+    loop_monitor = LoopMonitor(conf.LOOP_MONITOR_INTERVAL, conf.LOOP_LAG_WARNING, conf.LOOP_SLOW_CALLBACK)
+    loop_monitor.start()
+    bot = create_bot()
+    dp = None
+    compaction = None
 
-    # Установка команд меню
-    await set_main_menu(bot)
+    try:
+        # Независимые шаги инициализации идут параллельно; готовность — когда завершены все
+        startup = Startup(PROCESS_STARTED)
+        startup.step('routers', asyncio.to_thread, import_routers)
+        startup.step('db_pool', db.create_pool)
+        # Миграции: если схема актуальна — один запрос
+        startup.step('migrate', migrate, after=['db_pool'])
+        startup.step('warm_pool', db.warm_up, after=['migrate'])
+        startup.step('settings', settings.start, after=['migrate'])
+        # get_me кэшируется ботом (его же запросит polling) и заодно открывает соединение к Bot API
+        startup.step('bot_me', bot.me)
+        startup.step('menu', set_main_menu, bot)
+        # Пропускаем накопившиеся апдейты
+        startup.step('webhook', bot.delete_webhook, True)
+        await startup.wait()
+        logger.info(f"Applied migrations: {startup.result('migrate') or 'none'}")
+
+        dp = create_dispatcher()
+
+        # Периодически сворачиваем журнал зачислений в users.balance
+        compaction = asyncio.create_task(
+            run_balance_compaction(conf.BALANCE_COMPACTION_INTERVAL, conf.BALANCE_COMPACTION_BATCH)
+        )
+
+        health.ready = True
+        logger.info(startup.report())
+        logger.info("Bot is running...")
+        # Сессию бота закрываем сами — после того, как дождемся обработчиков
+        # С планировщиком polling ждет постановки апдейта в очередь (backpressure),
+        # задачи создает сам планировщик
+        await dp.start_polling(
+            bot, close_bot_session=False, handle_as_tasks=not conf.SCHEDULER_CONCURRENCY
+        )
+    finally:
+        await shutdown(bot, dp, compaction, loop_monitor, monitoring)
 
-    # Пропускаем накопившиеся апдейты и запускаем polling
-    await bot.delete_webhook(drop_pending_updates=True)
-    logger.info("Bot is running...")
-    await dp.start_polling(bot)
+
+async def shutdown(bot: Bot, dp: Optional[Dispatcher], compaction: Optional[asyncio.Task],
+                   loop_monitor: LoopMonitor, monitoring):
+    """
+    Остановка на том же event loop: polling уже остановлен, дожидаемся
+    выполняющихся апдейтов и отправок, сбрасываем очереди, закрываем пул
+    """
+    health.ready = False
+    started = time.perf_counter()
+    await drainer.drain(conf.SHUTDOWN_TIMEOUT)
+
+    if compaction:
+        compaction.cancel()
+        # Сворачиваем журнал зачислений напоследок, чтобы не копить его между запусками
+        try:
+            await asyncio.wait_for(compact_balance_deltas(conf.BALANCE_COMPACTION_BATCH), conf.SHUTDOWN_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Final balance compaction failed: {e}")
+
+    await bot.session.close()
+    if dp:
+        await dp.storage.close()
+    await loop_monitor.stop()
+    await tracer.shutdown()
+    await settings.stop()
+    await db.close_pool(timeout=conf.SHUTDOWN_TIMEOUT)
+    if monitoring:
+        await monitoring.cleanup()
+    logger.info(f"Shutdown completed in {time.perf_counter() - started:.2f}s")
 
 
 if __name__ == '__main__':
@@ -61,6 +190,3 @@ if __name__ == '__main__':
         asyncio.run(main())
     except (KeyboardInterrupt, SystemExit):
         logger.info("Bot stopped!")
-    finally:
-        # Закрываем соединение с БД
-        asyncio.run(db.close_pool())
\ No newline at end of file
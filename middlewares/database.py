@@ -1,11 +1,19 @@
+import logging
+
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject
 from typing import Callable, Dict, Any, Awaitable
-from database.connection import db
+from config.config import conf
+from database.connection import DatabaseBusyError, db
+from database.context import QueryCounter, current_user_id, update_queries
+from middlewares.load_shedding import answer_busy
+from middlewares.metrics import handler_name
+
+logger = logging.getLogger(__name__)
 
 
 class DatabaseMiddleware(BaseMiddleware):
-    """Middleware для проверки подключения к БД"""
+    """Middleware для проверки подключения к БД и передачи пользователя в слой БД"""
     
     async def __call__(
         self,
@@ -15,4 +23,34 @@ class DatabaseMiddleware(BaseMiddleware):
     ) -> Any:
         if not db.pool:
             await db.create_pool()
-        return await handler(event, data)
+        
+        # Нужен для маршрутизации чтений (read-your-writes) в Database
+        user = data.get('event_from_user')
+        user_token = current_user_id.set(user.id if user else None)
+        counter = QueryCounter()
+        counter_token = update_queries.set(counter)
+        try:
+            return await handler(event, data)
+        except DatabaseBusyError:
+            # Пул исчерпан дольше DB_ACQUIRE_TIMEOUT — лучше ответить сразу, чем молчать
+            logger.warning("Handler %s: no free database connection", handler_name(data))
+            await answer_busy(event)
+            return None
+        finally:
+            update_queries.reset(counter_token)
+            current_user_id.reset(user_token)
+            check_query_budget(handler_name(data), counter)
+
+
+def check_query_budget(name: str, counter: QueryCounter):
+    """Предупреждает о слишком большом числе запросов и о повторяющихся запросах (N+1)"""
+    if counter.count > conf.DB_QUERY_BUDGET:
+        logger.warning(
+            "Handler %s issued %d queries (budget %d), %.1f ms in database",
+            name, counter.count, conf.DB_QUERY_BUDGET, counter.total_time * 1000
+        )
+    for shape in counter.repeated(conf.DB_QUERY_REPEAT_LIMIT):
+        logger.warning(
+            "Handler %s repeated a query %d times (possible N+1): %s",
+            name, counter.shapes[shape], shape
+        )
@@ -0,0 +1,43 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from config.config import conf
+from database.load import DB_OVERLOADED, db_load
+from lexicon.lexicon_ru import LEXICON_RU
+from middlewares.metrics import handler_name
+from monitoring.metrics import Counter
+
+SHED_UPDATES = Counter('shed_updates_total', 'Low-priority updates rejected while the database is overloaded', ['handler'])
+
+
+async def answer_busy(event: TelegramObject):
+    if isinstance(event, CallbackQuery):
+        await event.answer(LEXICON_RU['db_busy'], show_alert=True)
+    elif isinstance(event, Message):
+        await event.answer(LEXICON_RU['db_busy'])
+
+
+class LoadSheddingMiddleware(BaseMiddleware):
+    """
+    При перегрузке БД отклоняет обработчики с флагом @flags.priority('low')
+    (статистика, новости, рефералы), оставляя пул операциям с деньгами.
+    Стоит до DatabaseMiddleware: отклоненный апдейт не обращается к БД.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        overloaded = db_load.overloaded(conf.SHED_ACQUIRE_WAIT, conf.SHED_ERROR_RATE)
+        DB_OVERLOADED.set(1 if overloaded else 0)
+        if not overloaded or get_flag(data, 'priority') != 'low':
+            return await handler(event, data)
+
+        SHED_UPDATES.inc(handler=handler_name(data))
+        await answer_busy(event)
+        return None
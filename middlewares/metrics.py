@@ -0,0 +1,67 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject, Update
+
+from monitoring.loop import track_handler
+from monitoring.metrics import (
+    BOT_API_DURATION, BOT_API_ERRORS, HANDLER_DURATION, HANDLER_ERRORS, UPDATES_TOTAL
+)
+
+
+def handler_name(data: Dict[str, Any]) -> str:
+    """Имя функции-обработчика, выбранной для события"""
+    handler = data.get('handler')
+    callback = getattr(handler, 'callback', None)
+    return getattr(callback, '__name__', 'unknown')
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Считает входящие апдейты по типам (outer middleware на dp.update)"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        UPDATES_TOTAL.inc(type=event.event_type)
+        return await handler(event, data)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Измеряет время и ошибки обработчиков"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        name = handler_name(data)
+        started = time.perf_counter()
+        try:
+            with track_handler(name):
+                return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            HANDLER_DURATION.observe(time.perf_counter() - started, handler=name)
+
+
+class BotApiMetricsMiddleware(BaseRequestMiddleware):
+    """Измеряет время и ошибки исходящих запросов к Bot API"""
+
+    async def __call__(self, make_request, bot, method):
+        api_method = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            BOT_API_ERRORS.inc(method=api_method, error=type(e).__name__)
+            raise
+        finally:
+            BOT_API_DURATION.observe(time.perf_counter() - started, method=api_method)
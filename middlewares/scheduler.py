@@ -0,0 +1,126 @@
+"""
+Планировщик апдейтов (outer middleware на dp.update, polling с handle_as_tasks=False).
+
+  * не больше concurrency обработчиков одновременно — остальные ждут в очереди,
+    а не в очереди к пулу БД;
+  * апдейты одного пользователя выполняются строго по порядку (FSM-шаги не обгоняют друг друга);
+  * если в очереди max_queue апдейтов, middleware не возвращает управление —
+    polling останавливается и новые апдейты остаются на стороне Telegram.
+
+Встроенные outer middleware aiogram (ошибки, FSM) выполняются раньше, при постановке
+в очередь. Поэтому состояние FSM перечитывается перед запуском обработчика, а ошибки
+обработчиков передаются в dp.errors самим планировщиком.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional
+
+from aiogram import BaseMiddleware, Router
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import ErrorEvent, TelegramObject, Update
+
+from monitoring.metrics import Gauge, Histogram
+from shutdown import drainer
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_QUEUE_DEPTH = Gauge('scheduler_queue_depth', 'Updates accepted but not yet finished')
+SCHEDULER_ACTIVE = Gauge('scheduler_active_handlers', 'Updates being handled right now')
+SCHEDULER_WAIT = Histogram('scheduler_wait_seconds', 'Time an update waited in the queue before handling')
+SCHEDULER_BACKPRESSURE = Histogram(
+    'scheduler_backpressure_seconds', 'Time polling was paused because the queue was full'
+)
+
+
+def _lane_key(data: Dict[str, Any]) -> Optional[Hashable]:
+    user = data.get('event_from_user')
+    if user is not None:
+        return user.id
+    chat = data.get('event_chat')
+    if chat is not None:
+        return ('chat', chat.id)
+    return None
+
+
+class UpdateScheduler(BaseMiddleware):
+    def __init__(self, concurrency: int, max_queue: int, router: Optional[Router] = None):
+        self.router = router
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.max_queue = max_queue
+        self.pending = 0
+        self.active = 0
+        # Очередь пользователя; существует, пока для него работает задача
+        self._lanes: Dict[Hashable, Deque] = {}
+        self._space = asyncio.Event()
+        SCHEDULER_QUEUE_DEPTH.set_function(lambda: self.pending)
+        SCHEDULER_ACTIVE.set_function(lambda: self.active)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        if self.pending >= self.max_queue:
+            started = time.perf_counter()
+            while self.pending >= self.max_queue:
+                self._space.clear()
+                await self._space.wait()
+            SCHEDULER_BACKPRESSURE.observe(time.perf_counter() - started)
+
+        job = (handler, event, data, time.perf_counter())
+        self.pending += 1
+        key = _lane_key(data)
+        lane = self._lanes.get(key) if key is not None else None
+        if lane is not None:
+            lane.append(job)
+            return None
+        lane = deque([job])
+        if key is not None:
+            self._lanes[key] = lane
+        # Задачи учитываются при остановке вместе с еще не начатыми апдейтами очереди
+        drainer.track_update(asyncio.create_task(self._run_lane(key, lane)))
+        return None
+
+    async def _handle_error(self, event: Update, data: Dict[str, Any], error: Exception):
+        """Ошибка обработчика — в dp.errors (ErrorsMiddleware aiogram ее уже не увидит)"""
+        if self.router is not None:
+            try:
+                response = await self.router.propagate_event(
+                    update_type='error', event=ErrorEvent(update=event, exception=error), **data
+                )
+                if response is not UNHANDLED:
+                    return
+            except Exception:
+                logger.exception("Error handler failed for update %s", event.update_id)
+        logger.error("Update %s failed", event.update_id, exc_info=error)
+
+    async def _run_lane(self, key: Optional[Hashable], lane: Deque):
+        try:
+            while lane:
+                handler, event, data, queued = lane[0]
+                async with self.semaphore:
+                    SCHEDULER_WAIT.observe(time.perf_counter() - queued)
+                    self.active += 1
+                    try:
+                        # Состояние, прочитанное FSM middleware при постановке в очередь,
+                        # могло измениться предыдущим апдейтом этого пользователя
+                        if 'state' in data:
+                            data['raw_state'] = await data['state'].get_state()
+                        await handler(event, data)
+                    except Exception as e:
+                        await self._handle_error(event, data, e)
+                    finally:
+                        self.active -= 1
+                lane.popleft()
+                self.pending -= 1
+                self._space.set()
+        finally:
+            # При отмене (остановка) оставшиеся апдейты очереди не выполнятся
+            self.pending -= len(lane)
+            lane.clear()
+            self._space.set()
+            if key is not None:
+                self._lanes.pop(key, None)
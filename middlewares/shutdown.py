@@ -0,0 +1,32 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject, Update
+
+from shutdown import drainer
+
+
+class DrainMiddleware(BaseMiddleware):
+    """Учитывает выполняющиеся апдейты (outer на dp.update)"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        drainer.track_update(asyncio.current_task())
+        return await handler(event, data)
+
+
+class DrainRequestMiddleware(BaseRequestMiddleware):
+    """Учитывает исходящие запросы к Bot API, чтобы не закрыть сессию посреди отправки"""
+
+    async def __call__(self, make_request, bot, method):
+        drainer.request_started()
+        try:
+            return await make_request(bot, method)
+        finally:
+            drainer.request_finished()
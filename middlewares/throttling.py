@@ -0,0 +1,69 @@
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from lexicon.lexicon_ru import LEXICON_RU
+from monitoring.metrics import Counter
+from services.throttling import Rate
+
+logger = logging.getLogger(__name__)
+
+THROTTLED_UPDATES = Counter('throttled_updates_total', 'Updates rejected by the rate limiter', ['group'])
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Ограничивает частоту запросов пользователя (token bucket). Группа обработчика
+    задается флагом: @flags.throttle('money'); без флага — группа default.
+    Стоит до DatabaseMiddleware: отклоненный апдейт не обращается к БД.
+    """
+
+    def __init__(self, buckets, rates: Dict[str, Rate], notice_interval: float):
+        self.buckets = buckets
+        self.rates = rates
+        self.notice_interval = notice_interval
+        # Пользователь -> когда можно снова ответить «подождите»
+        self._notices: Dict[int, float] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get('event_from_user')
+        group = get_flag(data, 'throttle', default='default')
+        rate = self.rates.get(group) or self.rates.get('default')
+        if user is None or rate is None:
+            return await handler(event, data)
+
+        try:
+            allowed = await self.buckets.acquire(group, rate, user.id)
+        except Exception as e:
+            # Ограничитель не должен ломать бота: при ошибке хранилища пропускаем
+            logger.error(f"Rate limiter failed: {e}")
+            allowed = True
+        if allowed:
+            return await handler(event, data)
+
+        THROTTLED_UPDATES.inc(group=group)
+        await self._notify(event, user.id)
+        return None
+
+    async def _notify(self, event: TelegramObject, user_id: int):
+        """Ответ «подождите» — не чаще раза в notice_interval на пользователя"""
+        now = time.monotonic()
+        notify = self._notices.get(user_id, 0) <= now
+        if notify:
+            if len(self._notices) > 10000:
+                self._notices = {uid: until for uid, until in self._notices.items() if until > now}
+            self._notices[user_id] = now + self.notice_interval
+        if isinstance(event, CallbackQuery):
+            # На callback отвечаем всегда, иначе у кнопки крутятся «часики»
+            await event.answer(LEXICON_RU['throttled'] if notify else None)
+        elif isinstance(event, Message) and notify:
+            await event.answer(LEXICON_RU['throttled'])
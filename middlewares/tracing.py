@@ -0,0 +1,37 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject
+
+from middlewares.metrics import handler_name
+from monitoring.tracing import tracer
+
+
+class TracingMiddleware(BaseMiddleware):
+    """Открывает trace на каждый апдейт: обработчик, пользователь, состояние FSM"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get('event_from_user')
+        name = handler_name(data)
+        with tracer.start_trace(
+            f"handler {name}",
+            handler=name,
+            event_type=type(event).__name__,
+            user_id=user.id if user else 0,
+            fsm_state=data.get('raw_state') or '',
+        ):
+            return await handler(event, data)
+
+
+class TracingRequestMiddleware(BaseRequestMiddleware):
+    """Span на каждый исходящий запрос к Bot API"""
+
+    async def __call__(self, make_request, bot, method):
+        with tracer.span(f"bot_api {type(method).__name__}", method=type(method).__name__):
+            return await make_request(bot, method)
@@ -0,0 +1,210 @@
+"""
+Денежные суммы в целых минимальных единицах (10^-8 USDT — та же точность,
+что у колонок DECIMAL(20, 8), поэтому переход без потерь).
+
+В базе суммы хранятся как DECIMAL(20, 8) или, при MONEY_MINOR_UNITS=1,
+как BIGINT в минимальных единицах. Сумма в коде (Amount) — в том же виде, что
+в базе: Decimal или Money. Перевод Decimal -> Money -> Decimal на каждой строке
+медленнее самой арифметики (см. bench/money.py), поэтому в режиме DECIMAL Money
+не используется. Код работает с суммами через parse_amount/percent/format_amount,
+from_db/to_db — на границе с базой.
+"""
+import re
+from decimal import Decimal, InvalidOperation, ROUND_DOWN, ROUND_HALF_EVEN, ROUND_HALF_UP
+from functools import lru_cache
+from typing import Optional, Union
+
+from config.config import conf
+
+SCALE = 10 ** 8
+DECIMAL_PLACES = 8
+_QUANT = Decimal(1).scaleb(-DECIMAL_PLACES)
+# Обычная запись без экспоненты и не длиннее точности — разбирается без Decimal
+_PLAIN_AMOUNT = re.compile(r'(-?)(\d+)(?:\.(\d{1,8}))?')
+
+
+@lru_cache(maxsize=64)
+def _rate_ratio(rate: Union[Decimal, int]) -> tuple:
+    """Ставка как несократимая дробь (ставок немного — кэшируем)"""
+    return Decimal(rate).as_integer_ratio()
+
+
+def _divide(numerator: int, denominator: int, rounding: str) -> int:
+    """Целочисленное деление с явным правилом округления"""
+    quotient, remainder = divmod(abs(numerator), denominator)
+    if remainder:
+        if rounding == ROUND_HALF_UP:
+            quotient += remainder * 2 >= denominator
+        elif rounding == ROUND_HALF_EVEN:
+            twice = remainder * 2
+            quotient += twice > denominator or (twice == denominator and quotient % 2 == 1)
+        elif rounding != ROUND_DOWN:
+            raise ValueError(f"Unsupported rounding: {rounding}")
+    return quotient if numerator >= 0 else -quotient
+
+
+class Money:
+    """Неизменяемая сумма в минимальных единицах"""
+
+    __slots__ = ('units',)
+
+    def __init__(self, units: int = 0):
+        object.__setattr__(self, 'units', int(units))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Money is immutable")
+
+    # --- Создание и преобразование ---
+
+    @classmethod
+    def from_decimal(cls, value: Union[Decimal, int, str], rounding: str = ROUND_HALF_UP) -> 'Money':
+        value = Decimal(value)
+        if not value.is_finite():
+            raise ValueError(f"Invalid amount: {value}")
+        return cls(int(value.quantize(_QUANT, rounding=rounding).scaleb(DECIMAL_PLACES)))
+
+    @classmethod
+    def parse(cls, text: str) -> 'Money':
+        """Разбирает ввод пользователя: "100", "100.5", "100,5"; ValueError при ошибке"""
+        text = text.strip().replace(',', '.')
+        match = _PLAIN_AMOUNT.fullmatch(text)
+        if match:
+            sign, whole, fraction = match.groups()
+            units = int(whole) * SCALE + int((fraction or '').ljust(DECIMAL_PLACES, '0'))
+            return cls(-units if sign else units)
+        try:
+            return cls.from_decimal(text)
+        except InvalidOperation:
+            raise ValueError(f"Invalid amount: {text!r}")
+
+    def to_decimal(self) -> Decimal:
+        return Decimal(self.units).scaleb(-DECIMAL_PLACES)
+
+    # --- Арифметика ---
+
+    def percent(self, rate: Union[Decimal, int], rounding: str = ROUND_HALF_UP) -> 'Money':
+        """
+        rate процентов от суммы. По умолчанию половина единицы округляется вверх —
+        так же, как Postgres округлял при записи в DECIMAL(20, 8)
+        """
+        numerator, denominator = _rate_ratio(rate)
+        return Money(_divide(self.units * numerator, denominator * 100, rounding))
+
+    def __add__(self, other):
+        if isinstance(other, Money):
+            return Money(self.units + other.units)
+        return NotImplemented
+
+    def __radd__(self, other):
+        # Поддержка sum(): начальное значение 0
+        if other == 0:
+            return self
+        return NotImplemented
+
+    def __sub__(self, other):
+        if isinstance(other, Money):
+            return Money(self.units - other.units)
+        return NotImplemented
+
+    def __neg__(self):
+        return Money(-self.units)
+
+    def __bool__(self):
+        return self.units != 0
+
+    # --- Сравнение ---
+
+    def __eq__(self, other):
+        return isinstance(other, Money) and self.units == other.units
+
+    def __hash__(self):
+        return hash(self.units)
+
+    def __lt__(self, other):
+        if isinstance(other, Money):
+            return self.units < other.units
+        return NotImplemented
+
+    def __le__(self, other):
+        if isinstance(other, Money):
+            return self.units <= other.units
+        return NotImplemented
+
+    def __gt__(self, other):
+        if isinstance(other, Money):
+            return self.units > other.units
+        return NotImplemented
+
+    def __ge__(self, other):
+        if isinstance(other, Money):
+            return self.units >= other.units
+        return NotImplemented
+
+    # --- Вывод ---
+
+    def __str__(self) -> str:
+        """Обычная запись без лишних нулей: 100, 100.5, 0.00000001"""
+        whole, fraction = divmod(abs(self.units), SCALE)
+        sign = '-' if self.units < 0 else ''
+        if not fraction:
+            return f"{sign}{whole}"
+        return f"{sign}{whole}.{fraction:08d}".rstrip('0')
+
+    def __repr__(self) -> str:
+        return f"Money('{self}')"
+
+    def format(self) -> str:
+        """Сумма для сообщений пользователю: "100.5 $" """
+        return f"{self} $"
+
+
+ZERO = Money(0)
+
+Amount = Union[Money, Decimal]
+
+
+def from_db(value) -> Amount:
+    """Значение денежной колонки (или выражения над ней): Money для BIGINT, Decimal как есть"""
+    if conf.MONEY_MINOR_UNITS:
+        return ZERO if value is None else Money(value)
+    return Decimal(0) if value is None else value
+
+
+def to_db(amount: Amount):
+    """Сумма в параметр запроса для денежной колонки"""
+    if isinstance(amount, Money):
+        return amount.units if conf.MONEY_MINOR_UNITS else amount.to_decimal()
+    return amount
+
+
+def parse_amount(text: str) -> Amount:
+    """Разбирает ввод пользователя в сумму текущего режима; ValueError при ошибке"""
+    if conf.MONEY_MINOR_UNITS:
+        return Money.parse(text)
+    text = text.strip().replace(',', '.')
+    if _PLAIN_AMOUNT.fullmatch(text):
+        return Decimal(text)
+    # Экспонента или больше 8 знаков — с теми же правилами округления, что у Money
+    try:
+        return Money.from_decimal(text).to_decimal()
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount: {text!r}")
+
+
+def percent(amount: Amount, rate: Union[Decimal, int], rounding: str = ROUND_HALF_UP) -> Amount:
+    """rate процентов от суммы с округлением до 10^-8 (см. Money.percent)"""
+    if isinstance(amount, Money):
+        return amount.percent(rate, rounding)
+    return (amount * rate / 100).quantize(_QUANT, rounding=rounding)
+
+
+def format_amount(amount: Optional[Amount]) -> str:
+    """Сумма для сообщений пользователю: "100.5 $", без нулей в конце и экспоненты"""
+    if isinstance(amount, Money):
+        return amount.format()
+    if not amount:
+        return "0 $"
+    text = format(amount, 'f')
+    if '.' in text:
+        text = text.rstrip('0').rstrip('.')
+    return f"{text} $"
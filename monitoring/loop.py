@@ -0,0 +1,135 @@
+"""
+Мониторинг event loop: задержка (lag) цикла и медленные синхронные участки.
+
+Lag — насколько позже запланированного просыпается фоновая задача: если какой-то
+обработчик надолго занял цикл синхронным кодом, ждут все пользователи. Это основной
+сигнал; в лог попадают обработчики, выполнявшиеся в момент задержки.
+
+Поиск конкретного медленного колбэка (LOOP_SLOW_CALLBACK > 0, по умолчанию выключен) —
+обертка над приватным asyncio.Handle._run для всего процесса: два perf_counter на каждый
+колбэк. Работает только со стандартным циклом asyncio (не с uvloop).
+"""
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from monitoring.metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+EVENT_LOOP_LAG = Histogram(
+    'event_loop_lag_seconds', 'Delay between scheduled and actual wake-up of the loop monitor',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+SLOW_CALLBACKS = Counter(
+    'event_loop_slow_callbacks_total', 'Loop callbacks that blocked longer than the threshold', ['handler']
+)
+
+# Обработчик, в контексте которого выполняется код (устанавливает HandlerMetricsMiddleware)
+current_handler: ContextVar[Optional[str]] = ContextVar('current_handler', default=None)
+
+# Обработчики, выполняющиеся прямо сейчас: id -> (имя, время начала)
+_in_flight: Dict[int, tuple] = {}
+
+
+@contextmanager
+def track_handler(name: str):
+    """Помечает код внутри блока как выполняющийся обработчик name"""
+    token = current_handler.set(name)
+    key = id(token)
+    _in_flight[key] = (name, time.perf_counter())
+    try:
+        yield
+    finally:
+        _in_flight.pop(key, None)
+        current_handler.reset(token)
+
+
+def in_flight_handlers() -> str:
+    """Выполняющиеся обработчики с длительностью, самые долгие первыми"""
+    now = time.perf_counter()
+    handlers = sorted(_in_flight.values(), key=lambda item: item[1])
+    return ', '.join(f"{name} ({(now - started) * 1000:.0f} ms)" for name, started in handlers) or 'none'
+
+
+def _callback_name(handle: asyncio.Handle) -> str:
+    callback = handle._callback
+    task = getattr(callback, '__self__', None)
+    if isinstance(task, asyncio.Task):
+        coro = task.get_coro()
+        return getattr(coro, '__qualname__', repr(coro))
+    return getattr(callback, '__qualname__', repr(callback))
+
+
+class LoopMonitor:
+    def __init__(self, interval: float, lag_warning: float, slow_callback: float):
+        self.interval = interval
+        self.lag_warning = lag_warning
+        self.slow_callback = slow_callback
+        self._task: Optional[asyncio.Task] = None
+        self._original_run = None
+
+    def start(self):
+        """Запускает измерение lag и (если slow_callback > 0) поиск медленных колбэков"""
+        if self.slow_callback:
+            loop = asyncio.get_running_loop()
+            if isinstance(loop, asyncio.BaseEventLoop) and hasattr(asyncio.Handle, '_run'):
+                self._install_hook()
+            else:
+                logger.warning(
+                    "Slow callback detection is not available for %s; only loop lag is measured",
+                    type(loop).__name__
+                )
+        if self.interval:
+            self._task = asyncio.create_task(self._measure_lag())
+
+    async def stop(self):
+        if self._original_run is not None:
+            asyncio.Handle._run = self._original_run
+            self._original_run = None
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _measure_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            EVENT_LOOP_LAG.observe(lag)
+            if self.lag_warning and lag >= self.lag_warning:
+                logger.warning(
+                    "Event loop lag %.0f ms; handlers in flight: %s",
+                    lag * 1000, in_flight_handlers()
+                )
+
+    def _install_hook(self):
+        original_run = self._original_run = asyncio.Handle._run
+        threshold = self.slow_callback
+
+        def _run(handle):
+            started = time.perf_counter()
+            original_run(handle)
+            duration = time.perf_counter() - started
+            if duration >= threshold:
+                _report_slow_callback(handle, duration)
+
+        asyncio.Handle._run = _run
+
+
+def _report_slow_callback(handle: asyncio.Handle, duration: float):
+    context = handle._context
+    handler = context.get(current_handler) if context is not None else None
+    SLOW_CALLBACKS.inc(handler=handler or 'unknown')
+    logger.warning(
+        "Slow callback %s blocked the loop for %.0f ms (handler: %s)",
+        _callback_name(handle), duration * 1000, handler or 'unknown'
+    )
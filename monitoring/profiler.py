@@ -0,0 +1,166 @@
+"""
+Профилирование работающего процесса по запросу администратора.
+
+Два режима:
+  * sampling — отдельный поток раз в interval снимает стек потока event loop
+    через sys._current_frames(); результат — топ функций и collapsed stacks
+    (формат flamegraph.pl / speedscope);
+  * cprofile — детерминированный cProfile в потоке event loop (точнее, но медленнее).
+
+Пока профилирование не запущено, накладных расходов нет.
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+# Кадры, в которых поток event loop ждет событий (простой, а не работа)
+IDLE_FILES = ('selectors.py',)
+
+
+def _frame_name(code) -> str:
+    path = code.co_filename
+    short = os.path.join(os.path.basename(os.path.dirname(path)), os.path.basename(path))
+    return f"{code.co_name} ({short}:{code.co_firstlineno})"
+
+
+@dataclass
+class ProfileResult:
+    mode: str
+    duration: float
+    summary: str
+    # (имя файла, содержимое)
+    files: List[Tuple[str, bytes]] = field(default_factory=list)
+
+
+class SamplingProfiler:
+    """Статистический профайлер потока event loop"""
+
+    mode = 'sampling'
+
+    def __init__(self, interval: float = 0.005, thread_id: Optional[int] = None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.idle = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            if frame.f_code.co_filename.endswith(IDLE_FILES):
+                self.idle += 1
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        """Стеки в формате "f1;f2;f3 count" для построения flamegraph"""
+        return '\n'.join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + '\n'
+
+    def top(self, limit: int = 20) -> str:
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for name in set(frames):
+                total[name] += count
+        busy = self.samples - self.idle
+        lines = [
+            f"Samples: {self.samples}, busy: {busy} "
+            f"({busy / self.samples * 100 if self.samples else 0:.1f}%), interval {self.interval * 1000:.0f} ms",
+            '',
+            'self%  total%  function',
+        ]
+        for name, count in own.most_common(limit):
+            lines.append(f"{count / busy * 100:5.1f}  {total[name] / busy * 100:6.1f}  {name}")
+        return '\n'.join(lines)
+
+    def result(self, duration: float) -> ProfileResult:
+        return ProfileResult(
+            self.mode, duration, self.top(),
+            [('profile.collapsed', self.collapsed().encode())]
+        )
+
+
+class CProfileProfiler:
+    """cProfile в потоке event loop (start/stop нужно вызывать из этого потока)"""
+
+    mode = 'cprofile'
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def result(self, duration: float) -> ProfileResult:
+        def report(sort: str, limit: int) -> str:
+            stream = io.StringIO()
+            pstats.Stats(self.profile, stream=stream).strip_dirs().sort_stats(sort).print_stats(limit)
+            return stream.getvalue()
+
+        return ProfileResult(
+            self.mode, duration, report('tottime', 20),
+            [('profile.txt', report('cumulative', 200).encode())]
+        )
+
+
+class ProfilerManager:
+    """Не больше одного сеанса профилирования на процесс"""
+
+    def __init__(self):
+        self.active = None
+        self.started = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self.active is not None
+
+    def start(self, mode: str = 'sampling', interval: float = 0.005):
+        if self.active is not None:
+            raise RuntimeError("Profiling is already running")
+        if mode == 'sampling':
+            profiler = SamplingProfiler(interval)
+        elif mode == 'cprofile':
+            profiler = CProfileProfiler()
+        else:
+            raise ValueError(f"Unknown profiling mode: {mode!r}")
+        profiler.start()
+        self.active = profiler
+        self.started = time.perf_counter()
+
+    def stop(self) -> Optional[ProfileResult]:
+        profiler, self.active = self.active, None
+        if profiler is None:
+            return None
+        profiler.stop()
+        return profiler.result(time.perf_counter() - self.started)
+
+
+profiler = ProfilerManager()
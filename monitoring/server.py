@@ -0,0 +1,61 @@
+"""
+HTTP-эндпоинты мониторинга: /metrics (Prometheus), /healthz и /readyz
+"""
+import logging
+from typing import Callable, Optional
+
+from aiohttp import web
+
+from monitoring.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+class HealthState:
+    """Готовность процесса принимать работу"""
+
+    def __init__(self):
+        self.ready = False
+        self.check: Optional[Callable[[], bool]] = None
+
+    def is_ready(self) -> bool:
+        if not self.ready:
+            return False
+        return self.check() if self.check else True
+
+
+health = HealthState()
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(
+        text=registry.render(),
+        content_type='text/plain',
+        charset='utf-8',
+        headers={'X-Content-Type-Options': 'nosniff'}
+    )
+
+
+async def healthz_handler(request: web.Request) -> web.Response:
+    return web.Response(text='ok')
+
+
+async def readyz_handler(request: web.Request) -> web.Response:
+    if health.is_ready():
+        return web.Response(text='ready')
+    return web.Response(text='not ready', status=503)
+
+
+async def start_monitoring_server(host: str, port: int) -> Optional[web.AppRunner]:
+    """Запускает HTTP-сервер мониторинга; port = 0 отключает его"""
+    if not port:
+        return None
+    app = web.Application()
+    app.router.add_get('/metrics', metrics_handler)
+    app.router.add_get('/healthz', healthz_handler)
+    app.router.add_get('/readyz', readyz_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("Monitoring server is listening on %s:%s", host, port)
+    return runner
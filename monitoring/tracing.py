@@ -0,0 +1,262 @@
+"""
+Легковесная трассировка: один trace на апдейт, дочерние span'ы для
+запросов к БД и к Bot API. Выборочные trace'ы пишутся в JSONL-файл
+или отправляются в OTLP/HTTP-коллектор (JSON).
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Span, внутри которого сейчас выполняется код
+current_span: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
+
+_NULL_CONTEXT = nullcontext()
+
+
+class Span:
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'start_ns', 'end_ns', 'attributes', 'error')
+
+    def __init__(self, trace: 'Trace', name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'trace_id': self.trace.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'duration_ms': round(self.duration_ms, 3),
+            'attributes': self.attributes,
+            'error': self.error,
+        }
+
+
+class Trace:
+    """Все span'ы одного апдейта"""
+
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.spans: List[Span] = []
+
+
+class BatchExporter:
+    """
+    Копит trace'ы и отправляет их пачками в фоновой задаче: export() вызывается
+    в конце обработки апдейта и не должен блокировать event loop
+    """
+
+    def __init__(self, batch_size: int = 100, flush_interval: float = 5.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._items: List[Any] = []
+        self._last_flush = time.monotonic()
+        self._flushing: Optional[asyncio.Task] = None
+        # Пачки уходят по одной и по порядку
+        self._lock = asyncio.Lock()
+
+    def _item(self, trace: Trace) -> List[Any]:
+        raise NotImplementedError
+
+    async def _send(self, items: List[Any]):
+        raise NotImplementedError
+
+    def export(self, trace: Trace):
+        self._items.extend(self._item(trace))
+        due = (
+            len(self._items) >= self.batch_size
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        )
+        if due and (self._flushing is None or self._flushing.done()):
+            self._flushing = asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        async with self._lock:
+            if not self._items:
+                return
+            items, self._items = self._items, []
+            self._last_flush = time.monotonic()
+            try:
+                await self._send(items)
+            except Exception as e:
+                logger.warning("Failed to export %d trace items: %s", len(items), e)
+
+    async def close(self):
+        await self.flush()
+
+
+class JsonlExporter(BatchExporter):
+    """Пишет каждый trace одной строкой JSON в файл; запись — в отдельном потоке"""
+
+    def __init__(self, path: str, batch_size: int = 100, flush_interval: float = 5.0):
+        super().__init__(batch_size, flush_interval)
+        self.path = path
+
+    def _item(self, trace: Trace) -> List[str]:
+        return [json.dumps(
+            {'trace_id': trace.trace_id, 'spans': [span.to_dict() for span in trace.spans]},
+            ensure_ascii=False, default=str
+        )]
+
+    def _write(self, lines: List[str]):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    async def _send(self, lines: List[str]):
+        await asyncio.to_thread(self._write, lines)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+class OtlpHttpExporter(BatchExporter):
+    """Отправляет span'ы пачками в OTLP/HTTP-коллектор (формат JSON)"""
+
+    def __init__(self, endpoint: str, service_name: str, batch_size: int = 100, flush_interval: float = 5.0):
+        super().__init__(batch_size, flush_interval)
+        self.url = endpoint.rstrip('/') + '/v1/traces'
+        self.service_name = service_name
+        # Одна сессия (и пул соединений к коллектору) на все отправки; создается при первой
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _item(self, trace: Trace) -> List[Span]:
+        return trace.spans
+
+    def _payload(self, spans: List[Span]) -> Dict[str, Any]:
+        otlp_spans = []
+        for span in spans:
+            item = {
+                'traceId': span.trace.trace_id,
+                'spanId': span.span_id,
+                'name': span.name,
+                'kind': 1,
+                'startTimeUnixNano': str(span.start_ns),
+                'endTimeUnixNano': str(span.end_ns or span.start_ns),
+                'attributes': [
+                    {'key': key, 'value': _otlp_value(value)} for key, value in span.attributes.items()
+                ],
+                'status': {'code': 2, 'message': span.error} if span.error else {'code': 1},
+            }
+            if span.parent_id:
+                item['parentSpanId'] = span.parent_id
+            otlp_spans.append(item)
+        return {'resourceSpans': [{
+            'resource': {'attributes': [
+                {'key': 'service.name', 'value': {'stringValue': self.service_name}}
+            ]},
+            'scopeSpans': [{'scope': {'name': self.service_name}, 'spans': otlp_spans}],
+        }]}
+
+    async def _send(self, spans: List[Span]):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        async with self._session.post(self.url, json=self._payload(spans)) as response:
+            if response.status >= 400:
+                logger.warning("OTLP collector responded with %s", response.status)
+
+    async def close(self):
+        await super().close()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class Tracer:
+    def __init__(self):
+        self.sample_rate = 0.0
+        self.exporter = None
+
+    def configure(self, exporter, sample_rate: float):
+        self.exporter = exporter
+        self.sample_rate = sample_rate if exporter else 0.0
+
+    @contextmanager
+    def start_trace(self, name: str, **attributes):
+        """Корневой span апдейта; не попавшие в выборку апдейты не трассируются"""
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            yield None
+            return
+        trace = Trace()
+        try:
+            with self._span(trace, name, None, attributes) as span:
+                yield span
+        finally:
+            try:
+                self.exporter.export(trace)
+            except Exception as e:
+                logger.warning("Failed to export trace: %s", e)
+
+    def span(self, name: str, **attributes):
+        """Дочерний span текущего trace'а (ничего не стоит, если trace не идет)"""
+        parent = current_span.get()
+        if parent is None:
+            return _NULL_CONTEXT
+        return self._span(parent.trace, name, parent.span_id, attributes)
+
+    @contextmanager
+    def _span(self, trace: Trace, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        span = Span(trace, name, parent_id, attributes)
+        trace.spans.append(span)
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            current_span.reset(token)
+
+    async def shutdown(self):
+        """Отправляет накопленные span'ы и закрывает экспортер"""
+        if self.exporter:
+            await self.exporter.close()
+
+
+tracer = Tracer()
+
+
+def configure_tracing(exporter_name: str, sample_rate: float, jsonl_path: str,
+                      otlp_endpoint: str, service_name: str):
+    """Настраивает глобальный tracer по конфигу"""
+    if exporter_name == 'jsonl':
+        exporter = JsonlExporter(jsonl_path)
+    elif exporter_name == 'otlp':
+        exporter = OtlpHttpExporter(otlp_endpoint, service_name)
+    elif not exporter_name:
+        exporter = None
+    else:
+        raise ValueError(f"Unknown tracing exporter: {exporter_name!r}")
+    tracer.configure(exporter, sample_rate)
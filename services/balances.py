@@ -0,0 +1,42 @@
+import asyncio
+import logging
+
+from database import queries
+from database.connection import db
+from money import Amount, to_db
+
+logger = logging.getLogger(__name__)
+
+
+async def credit_admin_topup(user_id: int, amount: Amount, admin_id: int):
+    """Начисление администратором: запись в журнал баланса и транзакция — атомарно"""
+    async with db.transaction('admin_topup') as tx:
+        await tx.execute(queries.CREDIT_BALANCE, to_db(amount), user_id, 'admin_topup')
+        await tx.execute(queries.INSERT_ADMIN_TOPUP, user_id, to_db(amount), admin_id)
+    # Пользователь получит уведомление и сразу проверит баланс
+    db.record_write(user_id)
+
+
+async def compact_balance_deltas(batch_size: int = 5000) -> int:
+    """
+    Сворачивает журнал balance_deltas в users.balance пачками по batch_size.
+    Возвращает число свернутых записей.
+    """
+    total = 0
+    while True:
+        result = await db.fetchrow(queries.COMPACT_BALANCE_DELTAS, batch_size)
+        total += result['deltas']
+        if result['deltas'] < batch_size:
+            return total
+
+
+async def run_balance_compaction(interval: float, batch_size: int):
+    """Фоновая задача: периодическое сворачивание журнала балансов"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            compacted = await compact_balance_deltas(batch_size)
+            if compacted:
+                logger.info("Compacted %d balance deltas", compacted)
+        except Exception as e:
+            logger.error(f"Balance compaction failed: {e}", exc_info=True)
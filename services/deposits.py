@@ -0,0 +1,31 @@
+from decimal import Decimal
+from typing import Optional
+
+from database import queries
+from database.connection import db
+from money import Amount, percent, to_db
+
+
+async def create_deposit(
+    user_id: int,
+    amount: Amount,
+    interest_rate: Decimal,
+    referral_bonus_percent: Decimal
+) -> Optional[int]:
+    """
+    Атомарно открывает депозит: списывает средства, создает депозит и
+    транзакцию, начисляет бонус рефереру. Возвращает ID депозита или None,
+    если на балансе недостаточно средств.
+    """
+    bonus_amount = percent(amount, referral_bonus_percent)
+    async with db.transaction('create_deposit') as tx:
+        await tx.execute(queries.FOLD_BALANCE_DELTAS, user_id)
+        deposit = await tx.fetchrow(
+            queries.CREATE_DEPOSIT,
+            user_id, to_db(amount), interest_rate, to_db(bonus_amount)
+        )
+    if not deposit:
+        return None
+    # Бонус реферера: его чтения баланса тоже должны идти на primary
+    db.record_write(deposit['referrer_id'])
+    return deposit['deposit_id']
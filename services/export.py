@@ -0,0 +1,77 @@
+import gzip
+from datetime import date, timedelta
+from typing import Optional
+
+from config.config import conf
+from database.connection import db
+from money import SCALE
+
+
+def _export_columns() -> str:
+    # В выгрузке суммы всегда в USDT, даже если в базе они в минимальных единицах
+    amount = f"amount::numeric / {SCALE} AS amount" if conf.MONEY_MINOR_UNITS else "amount"
+    return (
+        f"transaction_id, user_id, transaction_type, {amount}, status, "
+        "description, created_at, deposit_id, admin_id"
+    )
+
+
+def build_transactions_export_query(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    transaction_type: Optional[str] = None,
+    table: str = 'transactions'
+) -> tuple:
+    """
+    Собирает запрос выгрузки транзакций с фильтрами (даты включительно).
+    table — таблица или отдельная партиция transactions.
+    """
+    conditions = []
+    args = []
+    if date_from:
+        args.append(date_from)
+        conditions.append(f"created_at >= ${len(args)}")
+    if date_to:
+        args.append(date_to + timedelta(days=1))
+        conditions.append(f"created_at < ${len(args)}")
+    if transaction_type:
+        args.append(transaction_type)
+        conditions.append(f"transaction_type = ${len(args)}")
+
+    query = f"SELECT {_export_columns()} FROM {table}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY transaction_id"
+    return query, args
+
+
+async def export_transactions(
+    path: str,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    transaction_type: Optional[str] = None
+) -> int:
+    """
+    Потоково выгружает транзакции в CSV, сжатый gzip.
+    Строки приходят из Postgres кусками через COPY и сразу пишутся в файл,
+    весь результат в памяти не собирается. Возвращает количество строк.
+    """
+    query, args = build_transactions_export_query(date_from, date_to, transaction_type)
+    return await export_query(path, query, *args)
+
+
+async def export_query(path: str, query: str, *args) -> int:
+    """Выгружает результат запроса в CSV (gzip) через COPY; возвращает количество строк"""
+    with gzip.open(path, 'wb') as gz:
+        async def write_chunk(chunk: bytes):
+            gz.write(chunk)
+
+        status = await db.copy_from_query(
+            query, *args,
+            output=write_chunk,
+            format='csv',
+            header=True
+        )
+
+    # asyncpg возвращает статус вида 'COPY 123'
+    return int(status.split()[-1])
@@ -0,0 +1,60 @@
+import logging
+import os
+from datetime import date
+from typing import List
+
+from database.connection import db
+from database.partitions import PARENT, add_months, ensure_partitions, list_partitions, month_start
+from services.export import build_transactions_export_query, export_query
+
+logger = logging.getLogger(__name__)
+
+
+async def archive_old_partitions(retention_months: int, archive_dir: str) -> List[str]:
+    """
+    Выгружает в archive_dir/<партиция>.csv.gz и удаляет партиции transactions,
+    целиком старше retention_months месяцев. Партиции с ожидающими заявками
+    не трогаются. Возвращает имена удаленных партиций.
+    """
+    cutoff = add_months(month_start(date.today()), -retention_months)
+    os.makedirs(archive_dir, exist_ok=True)
+    async with db.connection('list_partitions') as conn:
+        partitions = await list_partitions(conn)
+
+    archived = []
+    for partition in partitions:
+        if partition.is_default or partition.end is None or partition.end.date() > cutoff:
+            continue
+        pending = await db.fetchval(f"SELECT COUNT(*) FROM {partition.name} WHERE status = 'pending'")
+        if pending:
+            logger.warning(f"Partition {partition.name} has {pending} pending transactions, not archiving")
+            continue
+
+        path = os.path.join(archive_dir, f"{partition.name}.csv.gz")
+        query, args = build_transactions_export_query(table=partition.name)
+        # Пишем во временный файл: недописанный архив не должен выглядеть готовым
+        rows = await export_query(path + '.tmp', query, *args)
+        os.replace(path + '.tmp', path)
+
+        async with db.transaction('archive_partition') as tx:
+            await tx.execute(f"ALTER TABLE {PARENT} DETACH PARTITION {partition.name}")
+            # Строки, добавленные после выгрузки, не должны пропасть вместе с таблицей
+            remaining = await tx.fetchval(f"SELECT COUNT(*) FROM {partition.name}")
+            if remaining != rows:
+                raise RuntimeError(
+                    f"Partition {partition.name} changed during archiving: {remaining} rows, {rows} archived"
+                )
+            await tx.execute(f"DROP TABLE {partition.name}")
+        logger.info(f"Archived partition {partition.name}: {rows} rows to {path}")
+        archived.append(partition.name)
+    return archived
+
+
+async def maintain_transaction_partitions(months_ahead: int, retention_months: int, archive_dir: str) -> dict:
+    """Создает партиции вперед и, если задан срок хранения, архивирует старые"""
+    async with db.connection('ensure_partitions') as conn:
+        created = await ensure_partitions(conn, months_ahead)
+    archived = []
+    if retention_months > 0:
+        archived = await archive_old_partitions(retention_months, archive_dir)
+    return {'created': created, 'archived': archived}
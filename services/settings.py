@@ -0,0 +1,113 @@
+"""
+Кэш admin_settings в памяти.
+
+Настройки меняются раз в несколько дней, а читаются на каждом открытии новостей
+и при каждом вводе пароля админки. Запись идет через settings.set(): в той же
+транзакции отправляется NOTIFY admin_settings, и все экземпляры бота перечитывают
+таблицу. Пока LISTEN-соединение не установлено (или потеряно), get() читает из БД.
+"""
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from database import queries
+from database.connection import db
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'admin_settings'
+
+
+class SettingsCache:
+    def __init__(self, retry_interval: float = 5.0):
+        self.retry_interval = retry_interval
+        self.values: Dict[str, Optional[str]] = {}
+        self.listening = False
+        self._conn = None
+        self._watcher: Optional[asyncio.Task] = None
+        self._reload_task: Optional[asyncio.Task] = None
+        self._stale = False
+
+    async def get(self, key: str) -> Optional[str]:
+        if self.listening:
+            return self.values.get(key)
+        return await db.fetchval(queries.GET_SETTING, key)
+
+    async def set(self, key: str, value: str):
+        async with db.transaction('set_setting') as tx:
+            await tx.execute(queries.SET_SETTING, key, value)
+            await tx.execute(queries.NOTIFY_SETTING, key)
+        # Свое уведомление тоже придет, но ответ админу не должен показать старое значение
+        self.values[key] = value
+
+    async def _load(self):
+        # С primary: реплика может еще не получить только что записанное значение
+        with db.use_primary():
+            rows = await db.fetch(queries.ALL_SETTINGS)
+        self.values = {row['setting_key']: row['setting_value'] for row in rows}
+
+    def _on_notify(self, conn, pid, channel, payload):
+        # Значение в уведомление не кладем (лимит NOTIFY — 8000 байт), таблица маленькая.
+        # Уведомление во время перечитывания — повод перечитать еще раз
+        logger.info(f"Setting {payload} changed, reloading settings")
+        self._stale = True
+        if self._reload_task is None or self._reload_task.done():
+            self._reload_task = asyncio.create_task(self._reload())
+
+    async def _reload(self):
+        try:
+            while self._stale:
+                self._stale = False
+                await self._load()
+        except Exception as e:
+            # Лучше читать из БД, чем отдавать устаревшее значение
+            self.listening = False
+            logger.error(f"Settings reload failed: {e}")
+            if self._conn is not None:
+                self._conn.terminate()
+
+    async def _connect(self) -> asyncio.Event:
+        """LISTEN, затем загрузка: изменение между ними не потеряется"""
+        conn = await db.connect()
+        lost = asyncio.Event()
+        conn.add_termination_listener(lambda _: lost.set())
+        try:
+            await conn.add_listener(CHANNEL, self._on_notify)
+            await self._load()
+        except BaseException:
+            await conn.close()
+            raise
+        self._conn = conn
+        self.listening = True
+        return lost
+
+    async def start(self):
+        """Загружает настройки и подписывается на изменения (шаг запуска бота)"""
+        lost = await self._connect()
+        self._watcher = asyncio.create_task(self._watch(lost))
+
+    async def _watch(self, lost: asyncio.Event):
+        while True:
+            await lost.wait()
+            self.listening = False
+            logger.warning("Settings listener connection lost, reading settings from database")
+            while True:
+                await asyncio.sleep(self.retry_interval)
+                try:
+                    lost = await self._connect()
+                    break
+                except Exception as e:
+                    logger.error(f"Settings listener reconnect failed: {e}")
+            logger.info("Settings listener reconnected")
+
+    async def stop(self):
+        self.listening = False
+        for task in (self._watcher, self._reload_task):
+            if task is not None:
+                task.cancel()
+        if self._conn is not None and not self._conn.is_closed():
+            await self._conn.close()
+        self._conn = None
+
+
+settings = SettingsCache()
@@ -0,0 +1,99 @@
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Tuple
+
+from database import queries
+from database.connection import db
+from monitoring.metrics import Gauge
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_BUCKETS = Gauge('throttle_buckets', 'Token buckets kept in memory')
+
+
+@dataclass(frozen=True)
+class Rate:
+    """capacity запросов за period секунд (и столько же подряд)"""
+    capacity: float
+    period: float
+
+    @property
+    def per_second(self) -> float:
+        return self.capacity / self.period
+
+
+def parse_rates(value: str) -> Dict[str, Rate]:
+    """ "default=5/2,money=3/10" -> {'default': Rate(5, 2), 'money': Rate(3, 10)} """
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        group, rate = item.split('=')
+        capacity, period = rate.split('/')
+        rates[group.strip()] = Rate(float(capacity), float(period))
+    return rates
+
+
+class MemoryBuckets:
+    """
+    Корзины в памяти процесса: (группа, пользователь) -> (токены, время обновления).
+    Полностью пополнившиеся корзины удаляются раз в sweep_interval — хранятся
+    только недавно активные пользователи.
+    """
+
+    def __init__(self, sweep_interval: float = 60, clock: Callable[[], float] = time.monotonic):
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+        self._buckets: Dict[Tuple[str, int], Tuple[float, float]] = {}
+        self._rates: Dict[str, Rate] = {}
+        self._next_sweep = clock() + sweep_interval
+        THROTTLE_BUCKETS.set_function(lambda: len(self._buckets))
+
+    async def acquire(self, group: str, rate: Rate, user_id: int) -> bool:
+        now = self.clock()
+        if now >= self._next_sweep:
+            self._sweep(now)
+        self._rates[group] = rate
+        key = (group, user_id)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            tokens = rate.capacity
+        else:
+            tokens = min(rate.capacity, bucket[0] + (now - bucket[1]) * rate.per_second)
+        if tokens < 1:
+            return False
+        self._buckets[key] = (tokens - 1, now)
+        return True
+
+    def _sweep(self, now: float):
+        self._next_sweep = now + self.sweep_interval
+        full = [
+            key for key, (tokens, updated) in self._buckets.items()
+            if tokens + (now - updated) * self._rates[key[0]].per_second >= self._rates[key[0]].capacity
+        ]
+        for key in full:
+            del self._buckets[key]
+
+
+class PostgresBuckets:
+    """Корзины в UNLOGGED-таблице throttle_buckets — общие для всех экземпляров бота"""
+
+    def __init__(self, sweep_interval: float = 60, clock: Callable[[], float] = time.monotonic):
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+        self._next_sweep = clock() + sweep_interval
+
+    async def acquire(self, group: str, rate: Rate, user_id: int) -> bool:
+        now = self.clock()
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval
+            await db.execute(queries.EVICT_THROTTLE_BUCKETS)
+        tokens = await db.fetchval(queries.THROTTLE_ACQUIRE, user_id, group, rate.capacity, rate.per_second)
+        return tokens is not None
+
+
+def create_buckets(backend: str, sweep_interval: float):
+    if backend == 'memory':
+        return MemoryBuckets(sweep_interval)
+    if backend == 'postgres':
+        return PostgresBuckets(sweep_interval)
+    raise ValueError(f"Unknown throttle backend: {backend!r}")
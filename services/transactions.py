@@ -0,0 +1,30 @@
+from database import queries
+from database.connection import db
+
+
+async def approve_transaction(transaction_id: int, admin_id: int):
+    """
+    Одобряет ожидающую транзакцию: пополнение зачисляется на баланс,
+    у вывода снимается резерв. Возвращает транзакцию или None,
+    если она не найдена или уже обработана.
+    """
+    transaction = await db.fetchrow(queries.APPROVE_TRANSACTION, transaction_id, admin_id)
+    if transaction:
+        # Пользователь узнает о зачислении и сразу проверит баланс
+        db.record_write(transaction['user_id'])
+    return transaction
+
+
+async def reject_transaction(transaction_id: int, admin_id: int, reason: str):
+    """
+    Отклоняет ожидающую транзакцию с указанием причины: резерв вывода
+    возвращается на баланс. Возвращает транзакцию или None,
+    если она не найдена или уже обработана.
+    """
+    transaction = await db.fetchrow(
+        queries.REJECT_TRANSACTION,
+        transaction_id, admin_id, f"\nПричина отклонения: {reason}"
+    )
+    if transaction:
+        db.record_write(transaction['user_id'])
+    return transaction
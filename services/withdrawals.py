@@ -0,0 +1,18 @@
+from typing import Optional
+
+from database import queries
+from database.connection import db
+from money import Amount, to_db
+
+
+async def reserve_withdrawal(user_id: int, amount: Amount, address: str) -> Optional[int]:
+    """
+    Резервирует средства под вывод и создает заявку со статусом 'pending'.
+    Возвращает ID транзакции или None, если на балансе недостаточно средств.
+    """
+    async with db.transaction('reserve_withdrawal') as tx:
+        await tx.execute(queries.FOLD_BALANCE_DELTAS, user_id)
+        return await tx.fetchval(
+            queries.RESERVE_WITHDRAWAL,
+            user_id, to_db(amount), f"Вывод на адрес {address}"
+        )
@@ -0,0 +1,66 @@
+"""
+Корректная остановка: после прекращения polling дожидаемся выполняющихся
+апдейтов и исходящих запросов к Bot API (не дольше срока), оставшиеся
+отменяем. Учет ведут middleware из middlewares/shutdown.py.
+"""
+import asyncio
+import logging
+import time
+from typing import Set
+
+logger = logging.getLogger(__name__)
+
+
+class Drainer:
+    def __init__(self):
+        self.updates: Set[asyncio.Task] = set()
+        self.requests = 0
+        self._requests_done = asyncio.Event()
+        self._requests_done.set()
+
+    def track_update(self, task: asyncio.Task):
+        self.updates.add(task)
+        task.add_done_callback(self.updates.discard)
+
+    def request_started(self):
+        self.requests += 1
+        self._requests_done.clear()
+
+    def request_finished(self):
+        self.requests -= 1
+        if not self.requests:
+            self._requests_done.set()
+
+    async def drain(self, timeout: float) -> dict:
+        """
+        Ждет выполняющиеся апдейты до timeout секунд (polling к этому моменту
+        уже остановлен — новых не будет). Возвращает число дождавшихся и отмененных.
+        """
+        deadline = time.monotonic() + timeout
+        updates = set(self.updates)
+        drained, aborted = set(), set()
+        if updates:
+            logger.info(f"Waiting for {len(updates)} in-flight updates (up to {timeout:.0f}s)...")
+            drained, aborted = await asyncio.wait(updates, timeout=timeout)
+            for task in aborted:
+                task.cancel()
+            if aborted:
+                await asyncio.wait(aborted, timeout=1)
+
+        # Отправки вне обработчиков (фоновые уведомления) тоже должны уйти до закрытия сессии
+        requests_left = 0
+        if self.requests:
+            try:
+                await asyncio.wait_for(self._requests_done.wait(), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                requests_left = self.requests
+
+        result = {'drained': len(drained), 'aborted': len(aborted), 'requests_left': requests_left}
+        logger.info(
+            f"Drained {result['drained']} updates, aborted {result['aborted']}, "
+            f"unfinished Bot API requests: {requests_left}"
+        )
+        return result
+
+
+drainer = Drainer()
@@ -0,0 +1,64 @@
+"""
+Параллельный запуск: независимые шаги инициализации выполняются одновременно,
+зависимые ждут только свои зависимости. По итогам — разбивка времени по шагам
+(в лог и в метрику startup_step_seconds).
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Sequence, Tuple
+
+from monitoring.metrics import Gauge
+
+logger = logging.getLogger(__name__)
+
+STARTUP_STEP_SECONDS = Gauge('startup_step_seconds', 'Duration of each startup step', ['step'])
+STARTUP_SECONDS = Gauge('startup_seconds', 'Time from process start to readiness')
+
+
+class Startup:
+    def __init__(self, started: float):
+        # started — time.perf_counter() в момент запуска процесса
+        self.started = started
+        # имя шага -> (начало относительно started, длительность)
+        self.timings: Dict[str, Tuple[float, float]] = {}
+        self._steps: Dict[str, asyncio.Task] = {}
+
+    def step(self, name: str, func: Callable[..., Awaitable], *args, after: Sequence[str] = ()) -> asyncio.Task:
+        """Запускает шаг сразу; after — шаги, которые должны завершиться до него"""
+        dependencies = [self._steps[dependency] for dependency in after]
+        task = asyncio.create_task(self._run(name, func, args, dependencies), name=f"startup:{name}")
+        self._steps[name] = task
+        return task
+
+    async def _run(self, name: str, func, args, dependencies):
+        if dependencies:
+            await asyncio.gather(*dependencies)
+        begin = time.perf_counter()
+        try:
+            return await func(*args)
+        finally:
+            duration = time.perf_counter() - begin
+            self.timings[name] = (begin - self.started, duration)
+            STARTUP_STEP_SECONDS.set(duration, step=name)
+
+    def result(self, name: str):
+        return self._steps[name].result()
+
+    async def wait(self):
+        """Ждет все шаги; при ошибке одного отменяет остальные"""
+        try:
+            await asyncio.gather(*self._steps.values())
+        except BaseException:
+            for task in self._steps.values():
+                task.cancel()
+            await asyncio.gather(*self._steps.values(), return_exceptions=True)
+            raise
+        STARTUP_SECONDS.set(time.perf_counter() - self.started)
+
+    def report(self) -> str:
+        total = time.perf_counter() - self.started
+        lines = [f"Startup took {total:.2f}s:"]
+        for name, (offset, duration) in sorted(self.timings.items(), key=lambda item: item[1][0]):
+            lines.append(f"  {name:<12} +{offset:.2f}s  {duration:.3f}s")
+        return '\n'.join(lines)
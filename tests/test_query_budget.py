@@ -0,0 +1,91 @@
+import asyncio
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from aiogram import Bot
+from aiogram.types import Chat, Message, User
+
+from bench.session import FakeSession
+from database.connection import db
+from database.testing import assert_max_queries, count_queries
+from handlers.private_user import cmd_referral
+
+USER_ROW = {
+    'user_id': 1, 'username': 'u', 'full_name': 'U', 'balance': Decimal(0), 'reserved_balance': Decimal(0),
+    'referral_code': 'CODE1234', 'referred_by': None, 'created_at': datetime(2026, 1, 1),
+    'is_admin': False, 'usdt_address': None,
+}
+
+
+class FakeConnection:
+    """Отвечает на любой запрос: строка пользователя или 0"""
+
+    async def fetchrow(self, query, *args):
+        return USER_ROW
+
+    async def fetchval(self, query, *args):
+        return 0
+
+    async def fetch(self, query, *args):
+        return []
+
+    async def execute(self, query, *args):
+        return 'SELECT 0'
+
+
+class FakePool:
+    async def acquire(self, timeout=None):
+        return FakeConnection()
+
+    async def release(self, conn):
+        pass
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    monkeypatch.setattr(db, 'pool', FakePool())
+    monkeypatch.setattr(db, 'replicas', [])
+
+
+def referral_message() -> Message:
+    bot = Bot('42:TEST', session=FakeSession())
+    return Message(
+        message_id=1, date=datetime.now(), text='/referral',
+        chat=Chat(id=1, type='private'), from_user=User(id=1, is_bot=False, first_name='U'),
+    ).as_(bot)
+
+
+def test_handler_within_budget(fake_db):
+    async def run():
+        with assert_max_queries(3) as counter:
+            await cmd_referral(referral_message())
+        return counter
+
+    counter = asyncio.run(run())
+    assert counter.count == 3
+    assert counter.repeated(2) == []
+
+
+def test_handler_over_budget(fake_db):
+    async def run():
+        with assert_max_queries(2):
+            await cmd_referral(referral_message())
+
+    with pytest.raises(AssertionError, match='Expected at most 2 queries, got 3'):
+        asyncio.run(run())
+
+
+def test_raw_queries_with_common_prefix_are_not_repeats(fake_db):
+    prefix = 'SELECT ' + ', '.join(f'column_{i}' for i in range(12))
+
+    async def run():
+        with count_queries() as counter:
+            await db.fetch(f'{prefix} FROM deposits')
+            await db.fetch(f'{prefix} FROM transactions')
+            await db.fetch('SELECT * FROM users WHERE user_id = 1')
+            await db.fetch('SELECT * FROM users WHERE user_id = 2')
+        return counter
+
+    counter = asyncio.run(run())
+    assert counter.repeated(2) == ['SELECT * FROM users WHERE user_id = ?']
@@ -0,0 +1,92 @@
+import asyncio
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.filters import StateFilter
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import Message, Update
+
+from middlewares.scheduler import UpdateScheduler
+
+
+class S(StatesGroup):
+    amount = State()
+
+
+def message_update(update_id: int, text: str) -> Update:
+    return Update.model_validate({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': 1, 'type': 'private'},
+            'from': {'id': 1, 'is_bot': False, 'first_name': 'u'},
+            'text': text,
+        },
+    })
+
+
+def make_dispatcher(calls: list) -> Dispatcher:
+    router = Router()
+
+    @router.message(F.text == 'withdraw')
+    async def start(message: Message, state: FSMContext):
+        # Пока обработчик ждет, второй апдейт уже стоит в очереди пользователя
+        await asyncio.sleep(0.01)
+        await state.set_state(S.amount)
+        calls.append('start')
+
+    @router.message(StateFilter(S.amount))
+    async def amount(message: Message, state: FSMContext):
+        calls.append(f'amount:{message.text}')
+
+    @router.message()
+    async def fallback(message: Message):
+        calls.append(f'fallback:{message.text}')
+
+    dp = Dispatcher()
+    dp.update.outer_middleware(UpdateScheduler(16, 1000, dp))
+    dp.include_router(router)
+    return dp
+
+
+async def wait_idle(dp: Dispatcher, bot: Bot, *updates: Update):
+    for update in updates:
+        await dp.feed_update(bot, update)
+    while asyncio.all_tasks() - {asyncio.current_task()}:
+        await asyncio.sleep(0.005)
+
+
+def test_queued_update_sees_state_set_by_previous_one():
+    calls = []
+
+    async def run():
+        dp = make_dispatcher(calls)
+        bot = Bot('42:TEST')
+        await wait_idle(dp, bot, message_update(1, 'withdraw'), message_update(2, '100'))
+
+    asyncio.run(run())
+    assert calls == ['start', 'amount:100']
+
+
+def test_handler_errors_reach_dispatcher_error_handlers():
+    errors = []
+
+    async def run():
+        dp = Dispatcher()
+        router = Router()
+
+        @router.message()
+        async def fail(message: Message):
+            raise ValueError('boom')
+
+        @dp.errors()
+        async def on_error(event):
+            errors.append(str(event.exception))
+
+        dp.update.outer_middleware(UpdateScheduler(16, 1000, dp))
+        dp.include_router(router)
+        await wait_idle(dp, Bot('42:TEST'), message_update(1, 'x'))
+
+    asyncio.run(run())
+    assert errors == ['boom']
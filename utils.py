@@ -1,21 +1,13 @@
-from decimal import Decimal
+from money import Money, format_amount, from_db
 
 
-def format_balance(balance: Decimal) -> str:
+def format_balance(balance) -> str:
     """
     Форматирует баланс, убирая лишние нули.
+    Принимает сумму или значение денежной колонки из БД.
     Если баланс пустой или равен 0, возвращает "0 $"
     Без научной нотации (не 1E+2, а 100).
     """
-    if balance is None:
-        return "0 $"
-    
-    balance_decimal = Decimal(str(balance))
-    
-    if balance_decimal == 0:
-        return "0 $"
-    
-    # Формат 'f' — обычная запись, без научной нотации; убираем лишние нули
-    balance_str = format(balance_decimal, '.10f').rstrip('0').rstrip('.')
-    
-    return f"{balance_str} $"
+    if not isinstance(balance, Money):
+        balance = from_db(balance)
+    return format_amount(balance)